@@ -5,10 +5,50 @@
 import math
 
 
+def format_pixels(pixels, fmt='points'):
+    """整理绘制结果的像素点列表
+
+    :param pixels: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 像素点坐标列表
+    :param fmt: (string) 输出格式，'points'原样返回；'unique'去掉重复的像素点，保留首次出现的顺序；
+                'spans'把同一行上连续的像素合并为水平区间[y, x_start, x_end]，按y、x从小到大排列
+    :return: (list of list of int) 整理后的像素点坐标列表或水平区间列表
+    """
+    if fmt == 'points':
+        return pixels
+    elif fmt == 'unique':
+        seen = set()
+        result = []
+        for x, y in pixels:
+            if (x, y) not in seen:
+                seen.add((x, y))
+                result.append([x, y])
+        return result
+    elif fmt == 'spans':
+        result = []
+        for y, x in sorted(set((y, x) for x, y in pixels)):
+            if result and result[-1][0] == y and result[-1][2] == x - 1:  # 与上一个区间相连
+                result[-1][2] = x
+            else:
+                result.append([y, x, x])
+        return result
+    raise ValueError(f'unknown pixel format: {fmt}')
+
+
+def pixel_output(func):
+    """装饰器：为绘制函数增加关键字参数fmt，绘制结果经format_pixels整理后返回"""
+    def wrapper(*args, fmt='points', **kwargs):
+        return format_pixels(func(*args, **kwargs), fmt)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+@pixel_output
 def draw_line(p_list, algorithm):
     """绘制线段
     :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
     :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'，此处的'Naive'仅作为示例，测试时不会出现
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     x0, y0 = p_list[0]
@@ -45,7 +85,7 @@ def draw_line(p_list, algorithm):
                     x0, y0, x1, y1 = x1, y1, x0, y0
                 xi = x0
                 for y in range(y0, y1 + 1):
-                    result.append([xi, round(y)])
+                    result.append([round(xi), y])
                     xi += 1 / k
     elif algorithm == 'Bresenham':
         if x0 == x1:
@@ -79,11 +119,13 @@ def draw_line(p_list, algorithm):
     return result
 
 
+@pixel_output
 def draw_polygon(p_list, algorithm):
     """绘制多边形
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
     :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     result = []
@@ -93,10 +135,12 @@ def draw_polygon(p_list, algorithm):
     return result
 
 
+@pixel_output
 def draw_ellipse(p_list):
     """绘制椭圆（采用中点圆生成算法）
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框左上角和右下角顶点坐标
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     result = []
@@ -138,16 +182,62 @@ def draw_ellipse(p_list):
     return result
 
 
-def draw_curve(p_list, algorithm):
+@pixel_output
+def draw_curve(p_list, algorithm, adaptive=False, tolerance=0.5):
     """绘制曲线
     :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
     :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'（三次均匀B样条曲线，曲线不必经过首末控制点）
+    :param adaptive: (bool) 对'Bezier'曲线自适应细分：不断从中点二分，直到每段的控制点到弦的距离都不超过tolerance，
+                     再用Bresenham算法把各段的弦连起来，像素数与曲线长度成正比且不会断开
+    :param tolerance: (float) 自适应细分的平直度阈值（像素）
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     res = []
-    if algorithm == 'Bezier':
+    if algorithm == 'Bezier' and adaptive:
+        def split(ctrl):  # de Casteljau算法在u=0.5处把曲线分成左右两段
+            left, right = [ctrl[0]], [ctrl[-1]]
+            while len(ctrl) > 1:
+                ctrl = [[(p[0] + q[0]) / 2, (p[1] + q[1]) / 2] for p, q in zip(ctrl, ctrl[1:])]
+                left.append(ctrl[0])
+                right.append(ctrl[-1])
+            return left, right[::-1]
+
+        def is_flat(ctrl):  # 所有控制点到首末点连线的距离都不超过tolerance时，曲线可以用弦代替
+            (x0, y0), (x1, y1) = ctrl[0], ctrl[-1]
+            dx, dy = x1 - x0, y1 - y0
+            length = math.hypot(dx, dy)
+            for x, y in ctrl[1:-1]:
+                if length == 0:
+                    d = math.hypot(x - x0, y - y0)
+                else:
+                    d = abs(dx * (y - y0) - dy * (x - x0)) / length
+                if d > tolerance:
+                    return False
+            return True
+
+        ends = [[round(p_list[0][0]), round(p_list[0][1])]]
+        stack = [(p_list, 0)]  # 后进先出，先处理左半段，保证端点按参数u递增的顺序输出
+        while stack:
+            ctrl, depth = stack.pop()
+            if depth < 20 and not is_flat(ctrl):
+                left, right = split(ctrl)
+                stack.append((right, depth + 1))
+                stack.append((left, depth + 1))
+            else:
+                end = [round(ctrl[-1][0]), round(ctrl[-1][1])]
+                if end != ends[-1]:
+                    ends.append(end)
+        res.append(ends[0])
+        for i in range(1, len(ends)):
+            line = draw_line([ends[i - 1], ends[i]], 'Bresenham')
+            if line[0] != ends[i - 1]:  # Bresenham可能从终点画起，调整为沿曲线方向
+                line.reverse()
+            res += line[1:]  # 相邻两段共用端点
+        return res
+    elif algorithm == 'Bezier':
         n = len(p_list) - 1
-        loc = [[[0, 0]] * (n + 1)] * (n + 1)  # 阶数r从0~n共(n+1)阶，每一阶的点数为(n+1-r)
+        loc = [[[0, 0]] * (n + 1 - r) for r in range(n + 1)]  # 阶数r从0~n共(n+1)阶，每一阶的点数为(n+1-r)
         loc[0] = p_list  # 初始化0阶点为控制点
         for v in range(1001):
             u = v / 1000  # u取值(0, 1)
@@ -158,11 +248,14 @@ def draw_curve(p_list, algorithm):
             res.append([round(loc[n][0][0]), round(loc[n][0][1])])
         return res
     elif algorithm == 'B-spline':
-        def curve_point(i, u):  # 第i条曲线上参数为u的点坐标
-            t = []
+        basis = []  # 每个参数u处4个基函数的值，所有曲线段共用
+        for v in range(1001):
+            u = v / 1000  # 每条曲线上u从(0, 1)
+            basis.append([-u ** 3 + 3 * u ** 2 - 3 * u + 1, 3 * u ** 3 - 6 * u ** 2 + 4,
+                          -3 * u ** 3 + 3 * u ** 2 + 3 * u + 1, u ** 3])
+
+        def curve_point(i, t):  # 第i条曲线上基函数值为t的点坐标
             point = [0, 0]
-            t += [-u ** 3 + 3 * u ** 2 - 3 * u + 1, 3 * u ** 3 - 6 * u ** 2 + 4,
-                  -3 * u ** 3 + 3 * u ** 2 + 3 * u + 1, u ** 3]
             for j in range(4):  # 每条曲线涉及4个控制点
                 point[0] += t[j] * p_list[i + j][0]
                 point[1] += t[j] * p_list[i + j][1]
@@ -171,9 +264,8 @@ def draw_curve(p_list, algorithm):
 
         n = len(p_list) - 1  # 控制点从0开始编号
         for i in range(n - 2):  # k=4为阶数，一共n+1-(k-1)=n-2条三次曲线
-            for v in range(1001):
-                u = v / 1000  # 每条曲线上u从(0, 1)
-                p = curve_point(i, u)
+            for t in basis:
+                p = curve_point(i, t)
                 res.append([round(p[0]), round(p[1])])
     return res
 
@@ -298,100 +390,70 @@ def clip(p_list, x_min, y_min, x_max, y_max, algorithm):
                 [round(x1 + u2 * (x2 - x1)), round(y1 + u2 * (y2 - y1))]]
 
 
-class Node:
-    def __init__(self, x=0, dx=0.0, y_max=0, nxt=None):
+class Edge:
+    """边表中的一条边：x为当前扫描线与边的交点横坐标，dx为斜率的倒数，y_max为边的较高端点纵坐标"""
+    __slots__ = ('x', 'dx', 'y_max')
+
+    def __init__(self, x, dx, y_max):
         self.x = x
         self.dx = dx
         self.y_max = y_max
-        self.next = nxt
-
-    def set_next(self, nxt):
-        self.next = nxt
-
-
-def create_net(y_max, y_min, p_list, n):
-    NET = []
-    for i in range(0, y_max + 1):
-        node = Node()
-        NET.append(node)
-    for i in range(y_min, y_max + 1):  # 从下到上创建NET
-        for j in range(0, n):
-            if p_list[j][1] == i:  # 遇到一个顶点将其作为边中的较低点
-                x0, y0 = p_list[j]
-                x1, y1 = p_list[(j - 1 + n) % n]  # 左右两条边
-                if y1 > y0:
-                    node = Node(x0, float((x1 - x0) / (y1 - y0)), y1, NET[i].next)
-                    NET[i].set_next(node)
-                x1, y1 = p_list[(j + 1 + n) % n]
-                if y1 > y0:
-                    node = Node(x0, float((x1 - x0) / (y1 - y0)), y1, NET[i].next)
-                    NET[i].set_next(node)
-    return NET
-
-
-def fill_polygon(p_list):
-    result = []
-    y_max, y_min = -9999, 9999
-    for x, y in p_list:
-        if y > y_max:
-            y_max = y
-        if y < y_min:
-            y_min = y
 
-    AET = Node()
 
+def create_edge_table(p_list):
+    """建立边表：每条非水平边按其较低端点的纵坐标分桶，只为有边开始的扫描线建桶，纵坐标可以为负
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :return: (dict of int: list of Edge) 扫描线纵坐标到从该扫描线开始的边的映射
+    """
+    table = {}
     n = len(p_list)
-    NET = create_net(y_max, y_min, p_list, n)  # 创建NET
+    for j in range(n):  # 遇到一个顶点将其作为边中的较低点
+        x0, y0 = p_list[j]
+        for x1, y1 in (p_list[j - 1], p_list[(j + 1) % n]):  # 左右两条边
+            if y1 > y0:
+                table.setdefault(y0, []).append(Edge(x0, float((x1 - x0) / (y1 - y0)), y1))
+    return table
+
+
+def fill_polygon(p_list, fmt='points'):
+    """扫描线填充多边形
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels；
+                'spans'直接由扫描线上每对交点之间的区间得到，不会逐个生成像素点
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 填充结果的像素点坐标列表
+    """
+    spans = []  # 每对交点之间的区间[y, x_start, x_end]，按扫描线和x从小到大排列
+    if len(p_list) == 0:
+        return spans
+    y_min = min(p[1] for p in p_list)
+    y_max = max(p[1] for p in p_list)
+    edge_table = create_edge_table(p_list)
+    active = []  # 活性边表，按x从小到大排列
 
     for i in range(y_min, y_max + 1):  # 从下到上处理扫描线
-        node1 = NET[i].next
-        node2 = AET
-        while node1 is not None:  # 将NET对应边插入AET中,并在插入时对x进行排序
-            while node2.next is not None and node1.x >= node2.next.x:
-                node2 = node2.next
-            temp = node1.next
-            node1.set_next(node2.next)
-            node2.set_next(node1)
-            node1 = temp
-            node2 = AET
-
-        node1 = AET  # 删除y_max == y_k的边否则保留
-        node2 = node1.next
-        while node2 is not None:
-            if node2.y_max == i:
-                node1.set_next(node2.next)
-                node2 = node1.next
+        active += edge_table.get(i, [])  # 将从该扫描线开始的边加入AET
+        active = [edge for edge in active if edge.y_max != i]  # 删除y_max == y_k的边否则保留
+        for edge in active:  # 计算AET中扫描线和边交点的横坐标x = x + 1/m
+            edge.x = edge.x + edge.dx
+        active.sort(key=lambda edge: edge.x)  # AET基本有序，排序接近线性时间
+
+        for k in range(0, len(active) - 1, 2):  # 将一对点之间的像素点加入到结果中
+            x_start, x_end = int(active[k].x), math.floor(active[k + 1].x)
+            if x_start <= x_end:
+                spans.append([i, x_start, x_end])
+
+    if fmt == 'spans':  # 合并同一行上重叠或相连的区间
+        result = []
+        for y, x_start, x_end in spans:
+            if result and result[-1][0] == y and x_start <= result[-1][2] + 1:
+                result[-1][2] = max(result[-1][2], x_end)
             else:
-                node1 = node1.next
-                node2 = node2.next
-
-        node = AET.next
-
-        while node is not None:  # 计算AET中扫描线和边交点的横坐标x = x + 1/m
-            node.x = node.x + node.dx
-            node = node.next
-
-        node1 = AET  # 对AET表按照x重新排序
-        node2 = AET.next
-        node1.set_next(None)
-        while node2 is not None:
-            while node1.next is not None and node2.x >= node1.next.x:
-                node1 = node1.next
-            temp = node2.next
-            node2.set_next(node1.next)
-            node1.set_next(node2)
-            node2 = temp
-            node1 = AET
-
-        node = AET.next
-        while node is not None and node.next is not None:
-            x = int(node.x)
-            while x <= node.next.x:
-                result.append([x, i])
-                x = x + 1
-            node = node.next.next  # 将一对点之间的像素点加入到结果中
-
-    return result
+                result.append([y, x_start, x_end])
+        return result
+    result = [[x, y] for y, x_start, x_end in spans for x in range(x_start, x_end + 1)]
+    return format_pixels(result, fmt)
 
 
 def is_inside(p1, p2, q):
@@ -407,64 +469,64 @@ def is_inside(p1, p2, q):
 
 def compute_intersection(p1, p2, p3, p4):
     """
-    计算p1p2和p3p4两条线段的交点
+    计算线段p1p2与p3p4所在直线的交点，交点表示为p1 + t * (p2 - p1)，两条直线平行时返回p2
     """
-    if p2[0] - p1[0] == 0:
-        x = p1[0]
-        m2 = (p4[1] - p3[1]) / (p4[0] - p3[0])
-        b2 = p3[1] - m2 * p3[0]
-        y = m2 * x + b2
-
-    elif p4[0] - p3[0] == 0:
-        x = p3[0]
-        m1 = (p2[1] - p1[1]) / (p2[0] - p1[0])
-        b1 = p1[1] - m1 * p1[0]
-        y = m1 * x + b1
-    else:
-        m1 = (p2[1] - p1[1]) / (p2[0] - p1[0])
-        b1 = p1[1] - m1 * p1[0]
-
-        m2 = (p4[1] - p3[1]) / (p4[0] - p3[0])
-        b2 = p3[1] - m2 * p3[0]
-
-        x = (b2 - b1) / (m1 - m2)
-        y = m1 * x + b1
-
-    return [x, y]
+    if p4[0] == p3[0] and p4[1] != p3[1]:  # 竖直的裁剪边，交点的x坐标就是裁剪边的x坐标
+        if p2[0] == p1[0]:
+            return [p2[0], p2[1]]
+        t = (p3[0] - p1[0]) / (p2[0] - p1[0])
+        return [p3[0], p1[1] + t * (p2[1] - p1[1])]
+    if p4[1] == p3[1] and p4[0] != p3[0]:  # 水平的裁剪边
+        if p2[1] == p1[1]:
+            return [p2[0], p2[1]]
+        t = (p3[1] - p1[1]) / (p2[1] - p1[1])
+        return [p1[0] + t * (p2[0] - p1[0]), p3[1]]
+    # p1、p2到直线p3p4的有向距离（乘以|p3p4|），与is_inside中的R相同
+    d1 = (p4[0] - p3[0]) * (p1[1] - p3[1]) - (p4[1] - p3[1]) * (p1[0] - p3[0])
+    d2 = (p4[0] - p3[0]) * (p2[1] - p3[1]) - (p4[1] - p3[1]) * (p2[0] - p3[0])
+    if d1 == d2:
+        return [p2[0], p2[1]]
+    t = d1 / (d1 - d2)
+    return [p1[0] + t * (p2[0] - p1[0]), p1[1] + t * (p2[1] - p1[1])]
+
+
+def orient_window(clip_list):
+    """
+    把凸的裁剪窗口的顶点调整为is_inside所要求的方向（窗口内部在每条边的R <= 0一侧），顺时针、逆时针给出均可
+    """
+    area = sum(clip_list[i - 1][0] * clip_list[i][1] - clip_list[i][0] * clip_list[i - 1][1]
+               for i in range(len(clip_list)))
+    return clip_list[::-1] if area > 0 else list(clip_list)
 
 
 def clip_polygon(p_list, clip_list):
+    """Sutherland-Hodgman多边形裁剪
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 被裁剪多边形的顶点坐标
+    :param clip_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 凸的裁剪窗口的顶点坐标，顺时针、逆时针均可
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], ...]) 裁剪后多边形的顶点坐标，完全在窗口外时为空列表
     """
-    p_list是被裁减多边形的顶点参数
-    clip_list是裁剪窗口的顶点参数
-    返回裁剪后的多边形的顶点参数
-    """
-    result = p_list.copy()
+    clip_list = orient_window(clip_list)
+    result = list(p_list)
 
     for i in range(len(clip_list)):
         # 一条边一条边迭代裁剪
-        next_polygon = result.copy()
-
+        polygon = result
         result = []
 
         # 下面两个点确定裁剪窗口的一条边
         c_edge_start = clip_list[i - 1]
         c_edge_end = clip_list[i]
-
-        for j in range(len(next_polygon)):
-
-            # 下面两个点确定被裁减多边形的一条边
-            s_edge_start = next_polygon[j - 1]
-            s_edge_end = next_polygon[j]
-
-            if is_inside(c_edge_start, c_edge_end, s_edge_end):
-                if not is_inside(c_edge_start, c_edge_end, s_edge_start): #终点在窗口内起点在窗口外
-                    intersection = compute_intersection(s_edge_start, s_edge_end, c_edge_start, c_edge_end)
-                    result.append(intersection)
-                result.append(s_edge_end) # 结果为交点和终点
-            elif is_inside(c_edge_start, c_edge_end, s_edge_start): # 终点在外起点在窗口内
-                intersection = compute_intersection(s_edge_start, s_edge_end, c_edge_start, c_edge_end)
-                result.append(intersection)
+        inside = [is_inside(c_edge_start, c_edge_end, p) for p in polygon]  # 每个顶点只判断一次
+
+        for j in range(len(polygon)):
+            # polygon[j - 1]、polygon[j]确定被裁减多边形的一条边
+            if inside[j]:
+                if not inside[j - 1]:  # 终点在窗口内起点在窗口外
+                    result.append(compute_intersection(polygon[j - 1], polygon[j], c_edge_start, c_edge_end))
+                result.append(polygon[j])  # 结果为交点和终点
+            elif inside[j - 1]:  # 终点在外起点在窗口内
+                result.append(compute_intersection(polygon[j - 1], polygon[j], c_edge_start, c_edge_end))
 
     result = [[round(p[0]), round(p[1])] for p in result]
     return result
@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 性能对比脚本，用法: python cg_bench.py [测试名 ...]，不带参数时运行全部测试
+import collections
+import concurrent.futures
+import filecmp
+import os
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import cg_algorithms as alg
+import cg_cli
+import cg_parser as parser
+import cg_scene
+import cg_vectorized as vec
+
+
+def best_time(func, repeat=5, number=1):
+    """返回func运行number次的最短耗时（秒）"""
+    return min(timeit.repeat(func, repeat=repeat, number=number))
+
+
+def report(name, t_old, t_new, old='list', new='vectorized'):
+    print(f'{name:<40s} {old}: {t_old * 1000:9.3f} ms   {new}: {t_new * 1000:9.3f} ms   '
+          f'speedup: {t_old / t_new:7.1f}x')
+
+
+def bench_line():
+    for algorithm in ['DDA', 'Bresenham']:
+        for length in [10, 100, 1000, 10000]:
+            p_list = [[0, 0], [length, length // 3]]
+            t_list = best_time(lambda: alg.draw_line(p_list, algorithm))
+            t_vec = best_time(lambda: vec.draw_line(p_list, algorithm))
+            report(f'draw_line {algorithm} length={length}', t_list, t_vec)
+
+
+def bench_lines():
+    rng = np.random.default_rng(0)
+    for algorithm in ['DDA', 'Bresenham']:
+        for count in [100, 10000]:
+            segments = rng.integers(0, 1000, (count, 4))
+            p_lists = [[[x0, y0], [x1, y1]] for x0, y0, x1, y1 in segments.tolist()]
+            t_list = best_time(lambda: [alg.draw_line(p, algorithm) for p in p_lists], repeat=3)
+            t_vec = best_time(lambda: vec.draw_lines(segments, algorithm), repeat=3)
+            report(f'draw_lines {algorithm} segments={count}', t_list, t_vec)
+    polygon = rng.integers(0, 1000, (500, 2)).tolist()
+    t_list = best_time(lambda: alg.draw_polygon(polygon, 'Bresenham'), repeat=3)
+    t_vec = best_time(lambda: vec.draw_polygon(polygon, 'Bresenham'), repeat=3)
+    report('draw_polygon Bresenham vertices=500', t_list, t_vec)
+
+
+def render_canvas_per_pixel():
+    """cg_cli原先的画布绘制方式：逐个像素赋值"""
+    canvas = np.zeros([cg_cli.height, cg_cli.width, 3], np.uint8)
+    canvas.fill(255)
+    for item_id, item in cg_cli.scene.items.items():
+        item_type, p_list, algorithm, color = item.item_type, cg_cli.scene.p_list(item_id), item.algorithm, item.color
+        if item_type == 'line':
+            pixels = alg.draw_line(p_list, algorithm)
+        elif item_type == 'polygon':
+            pixels = alg.draw_polygon(p_list, algorithm)
+        elif item_type == 'ellipse':
+            pixels = alg.draw_ellipse(p_list)
+        else:
+            pixels = alg.draw_curve(p_list, algorithm)
+        for x, y in pixels:
+            canvas[int(y), int(x)] = color
+    return canvas
+
+
+def run_script(path, on_save):
+    """逐条执行cg_cli指令文件，遇到saveCanvas时调用on_save(画布名)代替保存"""
+    for command in parser.parse_file(path):
+        if isinstance(command, parser.SaveCanvas):
+            on_save(command.name)
+        else:
+            cg_cli.func_dict[type(command)](command)
+
+
+def bench_save_canvas():
+    """input.txt中#1~#3每张画布只有几百到两千多个像素，逐像素赋值本身就只要1~3ms，
+    向量化后主要是固定开销（新建600x600画布约40us，每次numpy调用1~2us），加速比达不到10倍；
+    像素越多（#5）加速越明显"""
+    def on_save(name):
+        assert (render_canvas_per_pixel() == cg_cli.render_canvas()).all()
+        t_list = best_time(render_canvas_per_pixel, repeat=3)
+        t_vec = best_time(cg_cli.render_canvas, repeat=3)
+        report(f'saveCanvas input.txt #{name}', t_list, t_vec)
+
+    run_script(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input.txt'), on_save)
+
+
+def bench_bezier():
+    rng = np.random.default_rng(0)
+    for count in [3, 6, 10, 20]:
+        for size in [10, 100, 1000]:
+            p_list = rng.integers(0, size + 1, (count, 2)).tolist()
+            t_fixed = best_time(lambda: alg.draw_curve(p_list, 'Bezier'), repeat=3)
+            t_adaptive = best_time(lambda: alg.draw_curve(p_list, 'Bezier', adaptive=True), repeat=3)
+            n_fixed = len(alg.draw_curve(p_list, 'Bezier'))
+            n_adaptive = len(alg.draw_curve(p_list, 'Bezier', adaptive=True))
+            print(f'Bezier points={count:<3d} size={size:<5d} fixed: {t_fixed * 1000:9.3f} ms {n_fixed:6d} px   '
+                  f'adaptive: {t_adaptive * 1000:9.3f} ms {n_adaptive:6d} px   speedup: {t_fixed / t_adaptive:7.1f}x')
+
+
+def bench_curve():
+    rng = np.random.default_rng(0)
+    for algorithm in ['Bezier', 'B-spline']:
+        for count in [4, 20, 200]:
+            p_list = rng.integers(0, 1000, (count, 2)).tolist()
+            t_list = best_time(lambda: alg.draw_curve(p_list, algorithm), repeat=3)
+            t_vec = best_time(lambda: vec.draw_curve(p_list, algorithm), repeat=3)
+            report(f'draw_curve {algorithm} points={count}', t_list, t_vec)
+
+
+def bench_fill():
+    for size in [100, 1000, 2000]:
+        p_list = [[0, 0], [size - 1, size // 10], [size * 2 // 3, size - 1], [size // 10, size * 2 // 3]]
+        canvas = np.full([size, size, 3], 255, np.uint8)
+        color = np.zeros(3, np.uint8)
+
+        def paint_points():
+            cg_cli.paint_pixels(canvas, np.array(alg.fill_polygon(p_list)), color)
+
+        def paint_spans():
+            cg_cli.paint_spans(canvas, alg.fill_polygon(p_list, fmt='spans'), color)
+
+        report(f'fill_polygon size={size}', best_time(paint_points, repeat=3), best_time(paint_spans, repeat=3),
+               'points', 'spans')
+
+
+def write_script(fp, count):
+    """写出count条指令的脚本，各类指令轮流出现"""
+    templates = [
+        'drawLine line{0} 10 20 300 400 DDA\n',
+        'drawPolygon polygon{0} 10 10 200 30 180 200 20 150 Bresenham\n',
+        'drawEllipse ellipse{0} 100 100 300 200\n',
+        'drawCurve curve{0} 10 10 50 200 150 30 300 300 B-spline\n',
+        'setColor 255 0 {1}\n',
+        'translate line{0} 5 -5\n',
+        'rotate polygon{0} 100 100 30\n',
+        'scale ellipse{0} 100 100 0.5\n',
+    ]
+    for i in range(count):
+        fp.write(templates[i % len(templates)].format(i - i % len(templates), i % 256))
+
+
+def bench_parse():
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in [10 ** 6, 3 * 10 ** 6]:
+            path = os.path.join(tmp, f'script{count}.txt')
+            with open(path, 'w') as fp:
+                write_script(fp, count)
+            size = os.path.getsize(path) / 2 ** 20
+            start = time.perf_counter()
+            collections.deque(parser.parse_file(path), maxlen=0)  # 只消费不保存
+            elapsed = time.perf_counter() - start
+            tracemalloc.start()
+            collections.deque(parser.parse_file(path), maxlen=0)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'parse commands={count:<8d} file: {size:7.1f} MB   time: {elapsed:6.2f} s   '
+                  f'{count / elapsed / 1000:6.0f} k commands/s   peak memory: {peak / 1024:7.1f} KB')
+
+
+def write_animation(fp, items, frames, moving=1):
+    """写出动画式的脚本：先画items个图元，之后每帧平移moving个图元并保存一次画布"""
+    rng = np.random.default_rng(0)
+    fp.write('resetCanvas 600 600\n')
+    for i in range(items):
+        x, y = rng.integers(50, 450, 2)
+        fp.write(f'setColor {i * 37 % 256} {i * 91 % 256} {i * 53 % 256}\n')
+        kind = i % 5
+        if kind == 0:
+            fp.write(f'drawLine item{i} {x} {y} {x + 120} {y + 40} Bresenham\n')
+        elif kind == 1:
+            fp.write(f'drawPolygon item{i} {x} {y} {x + 100} {y + 10} {x + 60} {y + 90} DDA\n')
+        elif kind == 2:
+            fp.write(f'drawEllipse item{i} {x} {y} {x + 100} {y + 60}\n')
+        elif kind == 3:
+            fp.write(f'drawCurve item{i} {x} {y} {x + 40} {y + 120} {x + 80} {y - 40} {x + 120} {y + 60} Bezier\n')
+        else:
+            fp.write(f'fillPolygon item{i} {x} {y} {x + 90} {y + 20} {x + 50} {y + 80}\n')
+    fp.write('fillPolygon edge -50 10 50 10 -50 90\n')  # 部分在画布左侧之外，有些行整段在画布外
+    for frame in range(frames):
+        for k in range(moving):
+            fp.write(f'translate item{(frame * moving + k) % items} 3 -2\n')
+        fp.write(f'translate edge {-1 if frame % 2 else 2} 1\n')
+        fp.write(f'saveCanvas frame{frame}\n')
+
+
+def bench_parallel_save():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'animation.txt')
+        with open(path, 'w') as fp:
+            write_animation(fp, 100, 100)
+        serial_dir, parallel_dir = os.path.join(tmp, 'serial'), os.path.join(tmp, 'parallel')
+        os.makedirs(serial_dir)
+        os.makedirs(parallel_dir)
+        cg_cli.output_dir = serial_dir
+        start = time.perf_counter()
+        cg_cli.run(parser.parse_file(path))
+        t_serial = time.perf_counter() - start
+        jobs = os.cpu_count()
+        cg_cli.output_dir = parallel_dir
+        cg_cli.executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        cg_cli.queue_depth = 2 * jobs
+        try:
+            start = time.perf_counter()
+            cg_cli.run(parser.parse_file(path))
+            cg_cli.wait_saves()
+            t_parallel = time.perf_counter() - start
+        finally:
+            cg_cli.executor.shutdown()
+            cg_cli.executor = None
+        names = sorted(os.listdir(serial_dir))
+        assert filecmp.cmpfiles(serial_dir, parallel_dir, names, shallow=False)[0] == names
+        report(f'100 items, 100 saves, jobs={jobs}', t_serial, t_parallel, 'serial', 'parallel')
+
+
+def bench_incremental():
+    with tempfile.TemporaryDirectory() as tmp:
+        for items, moving in [(100, 1), (1000, 1), (1000, 10)]:
+            path = os.path.join(tmp, 'animation.txt')
+            with open(path, 'w') as fp:
+                write_animation(fp, items, 30, moving)
+            times = {'full': 0, 'incremental': 0}
+
+            def on_save(name):
+                start = time.perf_counter()
+                full = cg_cli.render_canvas()
+                times['full'] += time.perf_counter() - start
+                start = time.perf_counter()
+                incremental = cg_cli.render_incremental()
+                times['incremental'] += time.perf_counter() - start
+                assert (full == incremental).all()
+
+            run_script(path, on_save)
+            report(f'{items} items, {moving} moved per save, 30 saves', times['full'], times['incremental'],
+                   'full', 'incremental')
+
+
+def traced_memory(build):
+    """返回build()的结果仍然存活时，新分配的内存字节数"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_scene():
+    count = 10 ** 6
+    segments = np.random.default_rng(0).integers(1, 999, (count, 4)).tolist()
+    ids = [f'line{i}' for i in range(count)]  # 两种方式共用的图元ID，不计入内存
+    color = np.zeros(3, np.uint8)
+
+    def build_lists():
+        return {item_id: ['line', [[x0, y0], [x1, y1]], 'DDA', np.array(color)]
+                for item_id, (x0, y0, x1, y1) in zip(ids, segments)}
+
+    def build_scene():
+        store = cg_scene.Scene()
+        rgb = (0, 0, 0)
+        for item_id, (x0, y0, x1, y1) in zip(ids, segments):
+            store.add(item_id, 'line', [[x0, y0], [x1, y1]], 'DDA', rgb)
+        return store
+
+    m_list, m_scene = traced_memory(build_lists), traced_memory(build_scene)
+    print(f'memory per line item                     list: {m_list / count:7.1f} B   scene: {m_scene / count:7.1f} B   '
+          f'ratio: {m_list / m_scene:5.1f}x')
+    store = build_scene()
+    for item_count in [10 ** 4, 10 ** 5]:
+        small = cg_scene.Scene()
+        for i in range(item_count):
+            small.add(ids[i], 'line', store.vertices(ids[i]), 'DDA', (0, 0, 0))
+
+        def per_item():
+            canvas = np.full([1000, 1000, 3], 255, np.uint8)
+            for item_id, item in small.items.items():
+                cg_cli.paint_pixels(canvas, cg_cli.rasterize('line', small.p_list(item_id), 'DDA', 1000, 1000),
+                                    item.color)
+            return canvas
+
+        def batched():
+            return cg_cli.render_scene((1000, 1000, small))
+
+        assert (per_item() == batched()).all()
+        report(f'render {item_count} lines', best_time(per_item, repeat=1), best_time(batched, repeat=1),
+               'per item', 'batched')
+
+
+def bench_transforms():
+    rng = np.random.default_rng(0)
+    polygon = rng.integers(0, 1000, (10 ** 4, 2)).tolist()
+    steps = 360  # 每次旋转1度，转满一圈后理论上回到原处
+
+    def eager():
+        p_list = polygon
+        for _ in range(steps):
+            p_list = alg.rotate(p_list, 500, 500, 1)
+        return p_list
+
+    def lazy():
+        store = cg_scene.Scene()
+        store.add('p', 'polygon', polygon, 'DDA', (0, 0, 0))
+        for _ in range(steps):
+            store.transform('p', cg_scene.rotation(1), (500, 500))
+        return store.p_list('p')
+
+    report(f'rotate {steps} x 1 degree, vertices=10000', best_time(eager, repeat=1), best_time(lazy, repeat=1),
+           'eager', 'lazy')
+    for name, func in [('eager', eager), ('lazy', lazy)]:
+        error = np.abs(np.array(func()) - np.array(polygon)).max()
+        print(f'{name:<5s} max drift after a full turn: {error} px')
+
+
+def bench_bulk_transforms():
+    rng = np.random.default_rng(0)
+    store = cg_scene.Scene()
+    for i in range(10 ** 4):
+        store.add(f'polygon{i}', 'polygon', rng.integers(0, 1000, (rng.integers(3, 9), 2)), 'DDA', (0, 0, 0))
+    p_lists = [store.p_list(item_id) for item_id in store.items]
+    coords, offsets = store.materialized()
+    x, y = vec.item_centers(coords, offsets)
+    centers = list(zip(x.tolist(), y.tolist()))
+
+    def per_item_rotate():
+        return [alg.rotate(p, cx, cy, 30) for p, (cx, cy) in zip(p_lists, centers)]
+
+    assert np.concatenate(per_item_rotate()).tolist() == vec.rotate_items(coords, offsets, x, y, 30).tolist()
+    report('rotate 10000 polygons about own centers', best_time(per_item_rotate, repeat=3),
+           best_time(lambda: vec.rotate_items(coords, offsets, x, y, 30), repeat=3), 'per item', 'bulk')
+    report('scale 10000 polygons about own centers',
+           best_time(lambda: [alg.scale(p, cx, cy, 0.7) for p, (cx, cy) in zip(p_lists, centers)], repeat=3),
+           best_time(lambda: vec.scale_items(coords, offsets, x, y, 0.7), repeat=3), 'per item', 'bulk')
+    report('translate the whole scene', best_time(lambda: [alg.translate(p, 5, -3) for p in p_lists], repeat=3),
+           best_time(lambda: vec.translate_items(coords, offsets, 5, -3), repeat=3), 'per item', 'bulk')
+
+
+def bench_rotated_ellipse():
+    for a, b in [(30, 20), (300, 200)]:
+        def uncached():
+            vec._rotated_ellipse.cache_clear()
+            return vec.draw_rotated_ellipse((500, 500), a, b, 30, 'spans')
+
+        def polygon():  # 用很多边的多边形近似斜椭圆
+            t = np.linspace(0, 2 * np.pi, 720, endpoint=False)
+            points = np.column_stack((a * np.cos(t), b * np.sin(t))).round().astype(np.int64)
+            points = vec.rotate_items(points + 500, [0, len(points)], 500, 500, 30)
+            return vec.draw_polygon(points, 'Bresenham', fmt='spans')
+
+        report(f'rotated ellipse a={a} b={b}', best_time(polygon), best_time(uncached), '720-gon', 'conic')
+        report(f'rotated ellipse a={a} b={b}, moved', best_time(uncached),
+               best_time(lambda: vec.draw_rotated_ellipse((600, 400), a, b, 30, 'spans')), 'uncached', 'cached')
+
+
+def bench_ellipse_cache():
+    rng = np.random.default_rng(0)
+    sizes = [(3, 3), (5, 4), (8, 6), (20, 12)]  # 场景里反复出现的几种标记大小
+    boxes = []
+    for k in rng.integers(0, len(sizes), 10 ** 4).tolist():
+        (a, b), (x, y) = sizes[k], rng.integers(50, 950, 2).tolist()
+        boxes.append([[x - a, y - b], [x + a, y + b]])
+    for fmt in ['points', 'spans']:
+        t_list = best_time(lambda: [alg.draw_ellipse(p, fmt=fmt) for p in boxes], repeat=3)
+        t_vec = best_time(lambda: [vec.draw_ellipse(p, fmt=fmt) for p in boxes], repeat=3)
+        report(f'draw_ellipse x10000 markers, fmt={fmt}', t_list, t_vec, 'list', 'cached')
+    print(vec.ellipse_cache_info())
+
+
+def bench_clip_polygon():
+    t = np.linspace(0, 2 * np.pi, 10 ** 5, endpoint=False)
+    r = 400 + 80 * np.sin(37 * t)  # 边界起伏、多次进出窗口的星形
+    polygon = np.column_stack((500 + r * np.cos(t), 500 + r * np.sin(t))).round().astype(np.int64)
+    p_list = polygon.tolist()
+    rectangle = [[200, 150], [200, 800], [850, 800], [850, 150]]
+    hexagon = [[round(500 + 350 * np.cos(a)), round(500 + 350 * np.sin(a))] for a in np.arange(6) * np.pi / 3 + 0.2]
+    for name, window in [('rectangle', rectangle), ('rotated hexagon', hexagon)]:
+        assert alg.clip_polygon(p_list, window) == vec.clip_polygon(polygon, window).tolist()
+        report(f'clip_polygon vertices=100000, {name}', best_time(lambda: alg.clip_polygon(p_list, window), repeat=3),
+               best_time(lambda: vec.clip_polygon(polygon, window), repeat=3))
+
+
+benchmarks = {
+    'line': bench_line,
+    'lines': bench_lines,
+    'save_canvas': bench_save_canvas,
+    'bezier': bench_bezier,
+    'curve': bench_curve,
+    'fill': bench_fill,
+    'parse': bench_parse,
+    'parallel_save': bench_parallel_save,
+    'incremental': bench_incremental,
+    'scene': bench_scene,
+    'transforms': bench_transforms,
+    'bulk_transforms': bench_bulk_transforms,
+    'rotated_ellipse': bench_rotated_ellipse,
+    'ellipse_cache': bench_ellipse_cache,
+    'clip_polygon': bench_clip_polygon,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        print(f'===== {name} =====')
+        benchmarks[name]()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import argparse
+import collections
+import concurrent.futures
 import os
 import sys
 
@@ -8,151 +11,417 @@ import numpy as np
 from PIL import Image
 
 import cg_algorithms as alg
+import cg_parser as parser
+import cg_scene
+import cg_vectorized as vec
 
-input_file = sys.argv[1]
-output_dir = sys.argv[2]
-os.makedirs(output_dir, exist_ok=True)
-item_dict = {}
-pen_color = np.zeros(3, np.uint8)
+input_file = ''
+output_dir = ''
+scene = cg_scene.Scene()  # 按加入顺序保存的所有图元
+pen_color = (0, 0, 0)
 width = 0
 height = 0
+executor = None  # 并行保存画布的进程池，为None时在主进程中依次保存
+pending_saves = collections.deque()  # 已提交、尚未确认完成的保存任务
+queue_depth = 0  # 最多允许多少个保存任务同时未完成，超过时等待最早的任务
+framebuffer = None  # 上次保存的画布，resetCanvas后为None
+raster_cache = {}  # 图元ID -> 上次保存时该图元在画布内的栅格化结果，见item_raster
+dirty_ids = set()  # 上次保存之后新增、修改过的图元ID
 
 
-def reset_canvas(line):
-    global width, height, item_dict
-    width = int(line[1])
-    height = int(line[2])
-    item_dict = {}
+def reset_canvas(command):
+    global width, height, scene, framebuffer
+    width = command.width
+    height = command.height
+    scene = cg_scene.Scene()
+    framebuffer = None
+    raster_cache.clear()
+    dirty_ids.clear()
 
 
-def save_canvas(line):
-    global height, width, item_dict
-    save_name = line[1]
-    canvas = np.zeros([height, width, 3], np.uint8)
-    canvas.fill(255)
-    for item_type, p_list, algorithm, color in item_dict.values():
+def item_bbox(p_list):
+    """图元像素可能覆盖的范围：线段、多边形为顶点包围盒，椭圆为其矩形包围框，曲线在控制点凸包内，
+    四周各留1个像素的取整余量
+
+    :return: (tuple of int: (x_min, y_min, x_max, y_max))
+    """
+    xs = [p[0] for p in p_list]
+    ys = [p[1] for p in p_list]
+    return min(xs) - 1, min(ys) - 1, max(xs) + 1, max(ys) + 1
+
+
+def is_visible(p_list, canvas_width, canvas_height):
+    """图元的包围盒是否与画布相交，被裁剪掉的线段（p_list为空）不可见"""
+    if len(p_list) == 0:
+        return False
+    x_min, y_min, x_max, y_max = item_bbox(p_list)
+    return x_max >= 0 and y_max >= 0 and x_min < canvas_width and y_min < canvas_height
+
+
+def clip_segments(p_list, x_max, y_max):
+    """用Liang-Barsky算法把线段逐条裁剪到画布[0, x_max] x [0, y_max]内
+
+    :param p_list: (list of list of int) 线段端点，第i条线段为p_list[2i]到p_list[2i + 1]
+    :return: (list of list of int: [[x0, y0, x1, y1], ...]) 可见部分，完全在画布内的线段保持原样
+    """
+    segments = []
+    for i in range(0, len(p_list) - 1, 2):
+        (x0, y0), (x1, y1) = p_list[i], p_list[i + 1]
+        if 0 <= min(x0, x1) and max(x0, x1) <= x_max and 0 <= min(y0, y1) and max(y0, y1) <= y_max:
+            segments.append([x0, y0, x1, y1])
+            continue
+        visible = alg.clip([[x0, y0], [x1, y1]], 0, 0, x_max, y_max, 'Liang-Barsky')
+        if visible:
+            segments.append(visible[0] + visible[1])
+    return segments
+
+
+def rasterize(item_type, p_list, algorithm, canvas_width, canvas_height, ellipse=None):
+    """计算图元在画布内的像素坐标
+
+    包围盒完全在画布外的图元直接跳过；部分可见的线段和多边形的边先裁剪到画布范围再绘制，
+    绘制代价只与可见部分相关。
+    :param ellipse: (tuple or None) 旋转过的椭圆的参数，见cg_scene.Scene.ellipse，此时不再使用p_list
+    :return: (numpy.ndarray of int, shape (N, 2)) 图元的像素点坐标
+    """
+    if ellipse is not None:
+        (x, y), a, b, angle = ellipse
+        r = max(a, b) + 1  # 斜椭圆在以中心为圆心、长半轴为半径的圆内
+        if x + r < 0 or y + r < 0 or x - r >= canvas_width or y - r >= canvas_height:
+            return np.empty((0, 2), np.int64)
+        return vec.draw_rotated_ellipse(*ellipse)
+    if not is_visible(p_list, canvas_width, canvas_height):
+        return np.empty((0, 2), np.int64)
+    x_min, y_min, x_max, y_max = item_bbox(p_list)
+    inside = x_min >= 0 and y_min >= 0 and x_max < canvas_width and y_max < canvas_height
+    if item_type == 'line' or item_type == 'polygon':
+        if inside:
+            if item_type == 'line':
+                return vec.draw_line(p_list, algorithm)
+            return vec.draw_polygon(p_list, algorithm)
         if item_type == 'line':
-            pixels = alg.draw_line(p_list, algorithm)
-            for x, y in pixels:
-                canvas[y, x] = color
-        elif item_type == 'polygon':
-            pixels = alg.draw_polygon(p_list, algorithm)
-            for x, y in pixels:
-                canvas[y, x] = color
-        elif item_type == 'ellipse':
-            pixels = alg.draw_ellipse(p_list)
-            for x, y in pixels:
-                canvas[int(y), int(x)] = color
-        elif item_type == 'curve':
-            pixels = alg.draw_curve(p_list, algorithm)
-            for x, y in pixels:
-                canvas[y, x] = color
-    Image.fromarray(canvas).save(os.path.join(output_dir, save_name + '.bmp'), 'bmp')
-
-
-def set_color(line):
+            ends = p_list
+        else:  # 多边形的第i条边为p_list[i - 1]到p_list[i]
+            ends = [p for i in range(len(p_list)) for p in (p_list[i - 1], p_list[i])]
+        segments = clip_segments(ends, canvas_width - 1, canvas_height - 1)
+        return vec.draw_lines(segments, algorithm)[0]
+    elif item_type == 'ellipse':
+        return vec.draw_ellipse(p_list)
+    elif item_type == 'curve':
+        return vec.draw_curve(p_list, algorithm)
+    return np.empty((0, 2), np.int64)
+
+
+def paint_pixels(canvas, pixels, color, inside=False):
+    """用一次扁平下标赋值把像素写入画布，画布范围之外的像素直接丢弃
+
+    :param inside: (bool) 像素是否已知都在画布内，是则省去范围判断
+    """
+    if inside:
+        canvas[pixels[:, 1], pixels[:, 0]] = color
+        return
+    h, w = canvas.shape[:2]
+    xs, ys = pixels[:, 0], pixels[:, 1]
+    inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+    canvas.reshape(-1, 3)[ys[inside] * w + xs[inside]] = color
+
+
+def paint_spans(canvas, spans, color):
+    """用切片赋值把水平区间[y, x_start, x_end]写入画布，画布范围之外的部分直接丢弃"""
+    h, w = canvas.shape[:2]
+    for y, x_start, x_end in spans:
+        x_start, x_end = max(x_start, 0), min(x_end, w - 1)
+        if 0 <= y < h and x_start <= x_end:  # 整段在画布左侧时x_end + 1为负数，切片会从右侧绕回
+            canvas[y, x_start:x_end + 1] = color
+
+
+def snapshot():
+    """冻结当前场景
+
+    :return: (tuple: (width, height, scene)) 画布大小和场景的独立副本
+    """
+    return width, height, scene.copy()
+
+
+def batch_lines(store, canvas_width, canvas_height):
+    """把完全在画布内的线段按算法分组，直接从场景的坐标缓冲区取出端点，每组用一次vec.draw_lines画出
+
+    :param store: (cg_scene.Scene) 场景
+    :return: (dict) 图元ID -> (N, 2) 的像素数组，像素都在画布内
+    """
+    groups = {}
+    for index, (item_id, item) in enumerate(store.items.items()):
+        if item.item_type == 'line' and item.count == 2:
+            groups.setdefault(item.algorithm, []).append(index)
+    if not groups:
+        return {}
+    coords, offsets = store.materialized()
+    ids = list(store.items)
+    result = {}
+    limit = np.array([canvas_width - 1, canvas_height - 1] * 2)
+    for algorithm, indices in groups.items():
+        indices = np.array(indices)
+        segments = coords[offsets[indices][:, None] + np.arange(2)].reshape(-1, 4)
+        inside = ((segments >= 1) & (segments < limit)).all(axis=1)  # 同item_bbox的判断
+        pixels, pixel_offsets = vec.draw_lines(segments[inside], algorithm)
+        pixel_offsets = pixel_offsets.tolist()
+        for k, index in enumerate(indices[inside].tolist()):
+            result[ids[index]] = pixels[pixel_offsets[k]:pixel_offsets[k + 1]]
+    return result
+
+
+def render_scene(scene):
+    """按图元加入的顺序把场景中的所有图元画到白色画布上
+
+    :param scene: (tuple) snapshot()返回的场景
+    :return: (numpy.ndarray of uint8, shape (height, width, 3)) 画布
+    """
+    canvas_width, canvas_height, store = scene
+    canvas = np.full([canvas_height, canvas_width, 3], 255, np.uint8)
+    lines = batch_lines(store, canvas_width, canvas_height)
+    run, run_color = [], None  # 连续的、颜色相同的批量线段，像素互相覆盖的先后不影响结果，可以一次写入
+    for item_id, item in store.items.items():
+        if item_id in lines and item.color == run_color:
+            run.append(lines[item_id])
+            continue
+        if run:
+            paint_pixels(canvas, np.concatenate(run), run_color, inside=True)
+        if item_id in lines:
+            run, run_color = [lines[item_id]], item.color
+            continue
+        run, run_color = [], None
+        p_list = store.p_list(item_id)
+        if item.item_type == 'fill_polygon':
+            if is_visible(p_list, canvas_width, canvas_height):
+                paint_spans(canvas, alg.fill_polygon(p_list, fmt='spans'), item.color)
+        else:
+            paint_pixels(canvas, rasterize(item.item_type, p_list, item.algorithm, canvas_width, canvas_height,
+                                           store.ellipse(item_id)), item.color,
+                         inside=item.item_type == 'line' or item.item_type == 'polygon')  # rasterize已裁剪到画布内
+    if run:
+        paint_pixels(canvas, np.concatenate(run), run_color, inside=True)
+    return canvas
+
+
+def render_canvas():
+    """绘制当前场景
+
+    :return: (numpy.ndarray of uint8, shape (height, width, 3)) 画布
+    """
+    return render_scene(snapshot())
+
+
+def item_raster(item_type, p_list, algorithm, ellipse=None):
+    """栅格化一个图元并裁剪到当前画布内，作为增量绘制的缓存
+
+    :param ellipse: (tuple or None) 旋转过的椭圆的参数，见rasterize
+    :return: (tuple: (kind, data, bbox)) kind为'pixels'时data为 (N, 2) 的像素数组，为'spans'时data为 (K, 3) 的
+             水平区间数组；bbox为像素的包围盒(x_min, y_min, x_max, y_max)，右、下边界不含，没有像素时为None
+    """
+    if item_type == 'fill_polygon':
+        kind = 'spans'
+        spans = alg.fill_polygon(p_list, fmt='spans') if is_visible(p_list, width, height) else []
+        data = np.array(spans, np.int64).reshape(-1, 3)
+        data = data[(data[:, 0] >= 0) & (data[:, 0] < height)]
+        data[:, 1] = np.maximum(data[:, 1], 0)
+        data[:, 2] = np.minimum(data[:, 2], width - 1)
+        data = data[data[:, 1] <= data[:, 2]]
+        if len(data) == 0:
+            return kind, data, None
+        bbox = data[:, 1].min(), data[:, 0].min(), data[:, 2].max() + 1, data[:, 0].max() + 1
+    else:
+        kind = 'pixels'
+        data = rasterize(item_type, p_list, algorithm, width, height, ellipse)
+        xs, ys = data[:, 0], data[:, 1]
+        data = data[(xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)]
+        if len(data) == 0:
+            return kind, data, None
+        (x_min, y_min), (x_max, y_max) = data.min(axis=0), data.max(axis=0)
+        bbox = x_min, y_min, x_max + 1, y_max + 1
+    return kind, data, tuple(int(v) for v in bbox)
+
+
+def paint_raster(canvas, raster, color, region):
+    """把item_raster的结果中落在region = (x_min, y_min, x_max, y_max)（右、下边界不含）内的部分画到画布上"""
+    kind, data, bbox = raster
+    x0, y0, x1, y1 = region
+    if bbox is None or bbox[0] >= x1 or bbox[2] <= x0 or bbox[1] >= y1 or bbox[3] <= y0:
+        return
+    if kind == 'pixels':
+        xs, ys = data[:, 0], data[:, 1]
+        inside = (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+        canvas.reshape(-1, 3)[ys[inside] * canvas.shape[1] + xs[inside]] = color
+    else:
+        for y, x_start, x_end in data[(data[:, 0] >= y0) & (data[:, 0] < y1)]:
+            x_start, x_end = max(x_start, x0), min(x_end, x1 - 1)
+            if x_start <= x_end:
+                canvas[y, x_start:x_end + 1] = color
+
+
+def render_incremental():
+    """在上次保存的画布上只重绘变化的部分：变化图元新旧像素包围盒内先涂白，
+    再按加入顺序把与之相交的图元的缓存结果重画一遍，没有变化的图元不再栅格化
+
+    :return: (numpy.ndarray of uint8, shape (height, width, 3)) 画布，与render_canvas()的结果相同
+    """
+    global framebuffer
+    if framebuffer is None:
+        framebuffer = np.full([height, width, 3], 255, np.uint8)
+        damage = [(0, 0, width, height)]
+    else:
+        damage = []
+    for item_id in dirty_ids:
+        old = raster_cache.pop(item_id, None)
+        if old is not None and old[2] is not None:
+            damage.append(old[2])
+        if item_id in scene:
+            item = scene[item_id]
+            new = raster_cache[item_id] = item_raster(item.item_type, scene.p_list(item_id), item.algorithm,
+                                                      scene.ellipse(item_id))
+            if new[2] is not None:
+                damage.append(new[2])
+    dirty_ids.clear()
+    items = list(scene.items.items())
+    boxes = np.array([raster_cache[item_id][2] or (0, 0, 0, 0) for item_id, _ in items]).reshape(-1, 4)
+    # 每个区域只重画包围盒与之相交的图元
+    hits = [np.flatnonzero((boxes[:, 0] < x1) & (boxes[:, 2] > x0) & (boxes[:, 1] < y1) & (boxes[:, 3] > y0))
+            for x0, y0, x1, y1 in damage]
+    if sum(len(k) for k in hits) > len(items):  # 区域多且互相重叠时，不如用缓存结果把整个画布重画一遍
+        damage, hits = [(0, 0, width, height)], [np.arange(len(items))]
+    for (x0, y0, x1, y1), region_hits in zip(damage, hits):
+        framebuffer[y0:y1, x0:x1] = 255
+        for k in region_hits:  # 按加入顺序
+            item_id, item = items[k]
+            paint_raster(framebuffer, raster_cache[item_id], item.color, (x0, y0, x1, y1))
+    return framebuffer
+
+
+def save_scene(scene, path):
+    """绘制场景并保存为bmp文件，在进程池中执行"""
+    Image.fromarray(render_scene(scene)).save(path, 'bmp')
+
+
+def save_canvas(command):
+    path = os.path.join(output_dir, command.name + '.bmp')
+    if executor is None:
+        Image.fromarray(render_incremental()).save(path, 'bmp')
+        return
+    pending_saves.append(executor.submit(save_scene, snapshot(), path))
+    while len(pending_saves) > queue_depth:  # 限制未完成的任务数，同时也限制了等待序列化的场景所占的内存
+        pending_saves.popleft().result()
+
+
+def wait_saves():
+    """等待所有保存任务完成，任务中的异常在这里抛出"""
+    while pending_saves:
+        pending_saves.popleft().result()
+
+
+def set_color(command):
     global pen_color
-    pen_color[0] = int(line[1])
-    pen_color[1] = int(line[2])
-    pen_color[2] = int(line[3])
+    pen_color = (command.r, command.g, command.b)  # 之后画的图元共用这个元组
 
 
-def draw_line(line):
-    global item_dict
-    item_id = line[1]
-    x0 = int(line[2])
-    y0 = int(line[3])
-    x1 = int(line[4])
-    y1 = int(line[5])
-    algorithm = line[6]
-    item_dict[item_id] = ['line', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
+def draw_line(command):
+    scene.add(command.item_id, 'line', command.p_list, command.algorithm, pen_color)
+    dirty_ids.add(command.item_id)
 
 
 # TODO: 以下内容均在11月修改
-def draw_polygon(line):
-    global item_dict
-    item_id = line[1]
-    p_list = []
-    for i in range(2, len(line) - 2, 2):
-        p_list.append([int(line[i]), int(line[i + 1])])
-    # print(f"poly p_list is {p_list}")
-    algorithm = line[-1]
-    item_dict[item_id] = ['polygon', p_list, algorithm, np.array(pen_color)]
-
-
-def draw_ellipse(line):
-    global item_dict
-    item_id = line[1]
-    p_list = [[int(line[2]), int(line[3])], [int(line[4]), int(line[5])]]
-    item_dict[item_id] = ['ellipse', p_list, None, np.array(pen_color)]
-
-
-def draw_curve(line):
-    global item_dict
-    item_id = line[1]
-    p_list = []
-    for i in range(2, len(line) - 2, 2):
-        p_list.append([int(line[i]), int(line[i + 1])])
-    algorithm = line[-1]
-    item_dict[item_id] = ['curve', p_list, algorithm, np.array(pen_color)]
-
-
-def translate(line):
-    global item_dict
-    item_id = line[1]
-    p_list = item_dict[item_id][1]  # 图元原本的参数
-    dx, dy = int(line[2]), int(line[3])
-    item_dict[item_id][1] = alg.translate(p_list, dx, dy)  # 修改成平移后的参数
-
-
-def rotate(line):
-    global item_dict
-    item_id = line[1]
-    p_list = item_dict[item_id][1]  # 图元原本的参数
-    x, y, r = int(line[2]), int(line[3]), float(line[4])
-    item_dict[item_id][1] = alg.rotate(p_list, x, y, r)  # 修改成旋转后的参数
-
-
-def scale(line):
-    global item_dict
-    item_id = line[1]
-    p_list = item_dict[item_id][1]  # 图元原本的参数
-    x, y, s = int(line[2]), int(line[3]), float(line[4])
-    item_dict[item_id][1] = alg.scale(p_list, x, y, s)  # 修改成缩放后的参数
-
-
-def clip(line):
-    global item_dict
-    item_id = line[1]
-    p_list = [item_dict[item_id][1][0], item_dict[item_id][1][1]]  # 图元原本的参数，p_list是线段的起点和终点
-    x_min, y_min, x_max, y_max, algorithm = int(line[2]), int(line[3]), int(line[4]), int(line[5]), line[6]
-    item_dict[item_id][1] = alg.clip(p_list, x_min, y_min, x_max, y_max, algorithm)  # 修改成裁剪后的参数
+def draw_polygon(command):
+    scene.add(command.item_id, 'polygon', command.p_list, command.algorithm, pen_color)
+    dirty_ids.add(command.item_id)
+
+
+def fill_polygon(command):
+    scene.add(command.item_id, 'fill_polygon', command.p_list, None, pen_color)
+    dirty_ids.add(command.item_id)
+
+
+def draw_ellipse(command):
+    scene.add(command.item_id, 'ellipse', command.p_list, None, pen_color)
+    dirty_ids.add(command.item_id)
+
+
+def draw_curve(command):
+    scene.add(command.item_id, 'curve', command.p_list, command.algorithm, pen_color)
+    dirty_ids.add(command.item_id)
+
+
+# 平移、旋转、缩放只把变换矩阵复合到图元上，绘制时才作用于顶点，连续变换不会累积舍入误差
+def translate(command):
+    scene.transform(command.item_id, cg_scene.translation(command.dx, command.dy))
+    dirty_ids.add(command.item_id)
+
+
+def rotate(command):
+    scene.transform(command.item_id, cg_scene.rotation(command.r), (command.x, command.y))
+    dirty_ids.add(command.item_id)
+
+
+def scale(command):
+    scene.transform(command.item_id, cg_scene.scaling(command.s), (command.x, command.y))
+    dirty_ids.add(command.item_id)
+
+
+def clip(command):
+    p_list = scene.p_list(command.item_id)[:2]  # 图元变换后的参数，p_list是线段的起点和终点，裁剪结果作为新的原始顶点
+    scene.set_p_list(command.item_id, alg.clip(p_list, command.x_min, command.y_min, command.x_max, command.y_max,
+                                               command.algorithm))  # 修改成裁剪后的参数
+    dirty_ids.add(command.item_id)
 
 
 func_dict = {
-    'resetCanvas': reset_canvas,
-    'saveCanvas': save_canvas,
-    'setColor': set_color,
-    'drawLine': draw_line,
-    'drawPolygon': draw_polygon,
-    'drawEllipse': draw_ellipse,
-    'drawCurve': draw_curve,
-    'translate': translate,
-    'rotate': rotate,
-    'scale': scale,
-    'clip': clip,
+    parser.ResetCanvas: reset_canvas,
+    parser.SaveCanvas: save_canvas,
+    parser.SetColor: set_color,
+    parser.DrawLine: draw_line,
+    parser.DrawPolygon: draw_polygon,
+    parser.FillPolygon: fill_polygon,
+    parser.DrawEllipse: draw_ellipse,
+    parser.DrawCurve: draw_curve,
+    parser.Translate: translate,
+    parser.Rotate: rotate,
+    parser.Scale: scale,
+    parser.Clip: clip,
 }
 
+item_commands = {parser.Translate, parser.Rotate, parser.Scale, parser.Clip}  # 作用于已有图元的指令
+
+
+def run(commands):
+    """依次执行指令记录
+
+    :param commands: (iterable of namedtuple) cg_parser产出的指令记录
+    """
+    for command in commands:
+        if type(command) in item_commands and command.item_id not in scene:  # 对不存在的图元做变换
+            raise parser.ParseError(command.line_no, f'unknown item id {command.item_id!r}')
+        func_dict[type(command)](command)
+
+
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='执行绘图指令文件，把每次saveCanvas的画布保存为bmp文件')
+    arg_parser.add_argument('input_file', help="指令文件，'-'表示从标准输入读取")
+    arg_parser.add_argument('output_dir', help='bmp文件的保存目录')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=0,
+                            help='并行绘制、保存画布的进程数，0表示在主进程中依次保存（默认）')
+    arg_parser.add_argument('--queue-depth', type=int, default=None,
+                            help='最多允许多少次saveCanvas尚未完成，超过时暂停解析，默认为进程数的2倍')
+    args = arg_parser.parse_args()
+    input_file = args.input_file
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
 
-    with open(input_file, 'r') as fp:
-        line = fp.readline()
-        while line:
-            line = line.strip().split(' ')
-            try:
-                func_dict[line[0]](line)
-            except KeyError:
-                print(f'[ERROR] :You call the nonexistent func: {line[0]}!!!')
-                exit()
-            # print(width, height, item_dict, pen_color)
-            line = fp.readline()
+    if args.jobs > 0:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs)
+        queue_depth = args.queue_depth if args.queue_depth is not None else 2 * args.jobs
+    try:
+        run(parser.parse_file(input_file))
+        wait_saves()
+    except parser.ParseError as e:
+        print(f'[ERROR] {input_file}: {e}', file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if executor is not None:
+            executor.shutdown()
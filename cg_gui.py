@@ -2,11 +2,13 @@
 # -*- coding:utf-8 -*-
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+import numpy as np
 from PyQt5 import QtCore, QtGui
-from PyQt5.QtCore import QRectF, Qt
-from PyQt5.QtGui import QPainter, QMouseEvent, QColor, QPixmap, QIcon, QPen
+from PyQt5.QtCore import QRectF, Qt, QPoint, QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QPainter, QMouseEvent, QColor, QPixmap, QIcon, QPen, QPolygon, QImage
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -24,6 +26,72 @@ from PyQt5.QtWidgets import (
     QDoubleSpinBox, QFileDialog, QInputDialog)
 
 import cg_algorithms as alg
+import cg_scene
+import cg_vectorized as vec
+
+HEAVY_CURVE_POINTS = 100  # 控制点数不少于此值的B样条曲线放到后台线程栅格化（Bezier曲线向量化后总是很快）
+HEAVY_FILL_AREA = 300 * 300  # 包围盒面积不小于此值的填充多边形放到后台线程栅格化
+LOD_DELAY = 300  # 旋转、缩放停止这么多毫秒后才精确栅格化，在此之前只画粗略结果
+NO_TRANSFORM = ((0, 0), None, (0, 0))  # 没有变换时的变换状态(shift, matrix, pivot)
+
+
+def rasterize_item(item_type, p_list, algorithm, fmt, ellipse=None):
+    """调用cg_algorithms栅格化一个图元
+
+    :param item_type: (string) 图元类型
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 图元参数
+    :param algorithm: (string) 绘制算法
+    :param fmt: (string) 输出格式，见alg.format_pixels
+    :param ellipse: (tuple or None) 旋转过的椭圆的参数，见cg_scene.ellipse_params，此时不再使用p_list
+    :return: (list of list of int) 栅格化结果
+    """
+    if ellipse is not None:
+        return vec.draw_rotated_ellipse(*ellipse, fmt=fmt)
+    if len(p_list) == 0:  # 裁剪后没有剩余部分的图元
+        return []
+    elif item_type == 'line':
+        return alg.draw_line(p_list, algorithm, fmt=fmt)
+    elif item_type == 'polygon':
+        return alg.draw_polygon(p_list, algorithm, fmt=fmt)
+    elif item_type == 'fill_polygon':
+        return alg.fill_polygon(p_list, fmt=fmt)
+    elif item_type == 'ellipse':
+        return vec.draw_ellipse(p_list, fmt=fmt)
+    elif item_type == 'curve':
+        return vec.draw_curve(p_list, algorithm, fmt=fmt)  # 复用缓存的基函数矩阵
+    return []
+
+
+class RasterWorker(QObject):
+    """
+    后台栅格化线程，结果通过信号交回界面线程
+    """
+
+    finished = pyqtSignal(object, object, object)  # (图元, 缓存键, 栅格化结果)，任务出错时结果为None
+
+    def __init__(self):
+        super().__init__()
+        # 只开一个线程：过期的任务在排队时就能取消，也不会有多个任务同时和界面线程争抢GIL
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # 任务在submit返回前就完成时，回调直接在界面线程中执行；排队连接保证raster_ready总在submit返回之后才调用
+        self.finished.connect(lambda item, key, raster: item.raster_ready(key, raster), Qt.QueuedConnection)
+
+    def submit(self, item, key, item_type, p_list, algorithm, fmt):
+        """提交栅格化任务，完成后在界面线程中调用item.raster_ready(key, 栅格化结果)，任务出错时结果为None
+
+        :return: (concurrent.futures.Future) 任务，可以用cancel()取消
+        """
+        def done(f):
+            if not f.cancelled():  # 不能在回调里抛出异常，concurrent.futures只会记录日志后忽略
+                self.finished.emit(item, key, None if f.exception() is not None else f.result())
+
+        p_list = [list(p) for p in p_list]  # 复制一份，界面线程之后修改p_list不影响本任务
+        future = self.executor.submit(rasterize_item, item_type, p_list, algorithm, fmt)
+        future.add_done_callback(done)
+        return future
+
+
+raster_worker = RasterWorker()
 
 
 class MyCanvas(QGraphicsView):
@@ -43,11 +111,17 @@ class MyCanvas(QGraphicsView):
         self.temp_id = ''
         self.temp_item = None
         self.begin = []  # 图形变换时选中的第一个控制点
-        self.rawList = []  # 图形变换时原图元控制参数
+        self.raw_state = NO_TRANSFORM  # 图形变换开始时图元的变换状态
 
         self.rotate_angle = 0  # 旋转角度
         self.scale_factor = 1  # 缩放比例
 
+        self.lod_item = None  # 正在旋转、缩放，暂时只画粗略结果的图元
+        self.lod_timer = QTimer(self)  # 滚轮和数值框没有松开鼠标的时机，停止操作一段时间后再精确栅格化
+        self.lod_timer.setSingleShot(True)
+        self.lod_timer.setInterval(LOD_DELAY)
+        self.lod_timer.timeout.connect(self.finish_lod)
+
     def start_draw_line(self, algorithm, item_id):
         self.status = 'line'
         self.temp_algorithm = algorithm
@@ -82,19 +156,16 @@ class MyCanvas(QGraphicsView):
             return
         self.status = 'translate'
         self.temp_item = self.item_dict[self.selected_id]  # 所要操作的是被选中图元
-        self.rawList = self.temp_item.p_list
+        self.raw_state = self.temp_item.transform_state
 
     def start_rotate(self):
         if self.selected_id == '':
             QMessageBox.warning(self, '注意', '请先在右侧选定图元', QMessageBox.Yes, QMessageBox.Yes)
             return
-        if self.item_dict[self.selected_id].item_type == 'ellipse':  # 还没有选图元或者选椭圆不做任何动作
-            QMessageBox.warning(self, '注意', '椭圆不提供旋转功能', QMessageBox.Yes, QMessageBox.Yes)
-            return
         self.rotate_angle = 0  # 从0开始防止上次旋转角度的叠加
         self.status = 'rotate'
         self.temp_item = self.item_dict[self.selected_id]  # 所要操作的是被选中图元
-        self.rawList = self.temp_item.p_list
+        self.raw_state = self.temp_item.transform_state
 
     def start_scale(self):
         if self.selected_id == '':
@@ -103,7 +174,7 @@ class MyCanvas(QGraphicsView):
         self.scale_factor = 1  # 防止上次操作的叠加
         self.status = 'scale'
         self.temp_item = self.item_dict[self.selected_id]  # 所要操作的是被选中图元
-        self.rawList = self.temp_item.p_list
+        self.raw_state = self.temp_item.transform_state
 
     def start_remove(self):
         if self.selected_id == '':
@@ -131,6 +202,20 @@ class MyCanvas(QGraphicsView):
             return
         self.status = 'clip_polygon'
 
+    def start_lod(self):
+        """旋转、缩放过程中先画粗略结果，停止操作LOD_DELAY毫秒后再精确栅格化"""
+        if self.lod_item is not self.temp_item:
+            self.finish_lod()
+        self.lod_item = self.temp_item
+        self.lod_item.set_coarse(True)
+        self.lod_timer.start()  # 每次操作都重新计时
+
+    def finish_lod(self):
+        self.lod_timer.stop()
+        if self.lod_item is not None:
+            self.lod_item.set_coarse(False)
+            self.lod_item = None
+
     def finish_draw(self):
         self.temp_item = None
         self.temp_id = str(self.status) + self.main_window.get_id()
@@ -138,6 +223,7 @@ class MyCanvas(QGraphicsView):
     def clear_selection(self):
         if self.selected_id != '':
             self.item_dict[self.selected_id].selected = False
+            self.item_dict[self.selected_id].update()
             self.selected_id = ''
         self.main_window.beginx_box.setEnabled(False)
         self.main_window.beginy_box.setEnabled(False)
@@ -158,7 +244,6 @@ class MyCanvas(QGraphicsView):
             self.item_dict[selected].selected = True
             self.item_dict[selected].update()
             self.status = ''
-            self.updateScene([self.sceneRect()])
             self.main_window.angle_box.setValue(0)  # 选择图元改变后从零开始
             self.main_window.factor_box.setValue(1)
             self.main_window.beginx_box.setEnabled(False)
@@ -172,6 +257,7 @@ class MyCanvas(QGraphicsView):
         pixmap.fill(QColor(255, 255, 255))  # 涂满白色
         painter.begin(pixmap)
         for item in self.item_dict:
+            self.item_dict[item].rasterize(wait=True)  # 保存时不能用预览结果，后台还没算完的图元在这里算出精确结果
             self.item_dict[item].paint(painter, QStyleOptionGraphicsItem)
         painter.end()
         pixmap.save(filename, "bmp", 100)
@@ -205,7 +291,7 @@ class MyCanvas(QGraphicsView):
                     self.add_item()
                     self.setMouseTracking(False)
                 else:
-                    self.temp_item.p_list.append([x, y])  # 按左键表示继续增加本多边形的参数点
+                    self.temp_item.add_point([x, y])  # 按左键表示继续增加本多边形的参数点
 
         elif self.status == 'ellipse':
             self.temp_item = MyItem(self.temp_id, self.status, [[x, y], [x, y]], None,
@@ -225,7 +311,7 @@ class MyCanvas(QGraphicsView):
                     self.add_item()
                     self.setMouseTracking(False)
                 else:
-                    self.temp_item.p_list.append([x, y])  # 按左键表示继续增加本曲线的控制点
+                    self.temp_item.add_point([x, y])  # 按左键表示继续增加本曲线的控制点
 
         elif self.status == 'translate':
             self.begin = [x, y]
@@ -243,7 +329,6 @@ class MyCanvas(QGraphicsView):
                                     QColor(0, 255, 0))  # 裁剪时画一个矩形框
             self.scene().addItem(self.temp_item)
 
-        self.updateScene([self.sceneRect()])
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
@@ -253,19 +338,19 @@ class MyCanvas(QGraphicsView):
         if self.temp_item is None:
             return
         if self.status == 'line':
-            self.temp_item.p_list[1] = [x, y]
+            self.temp_item.set_point(1, [x, y])
         # TODO: 11月修改
         elif self.status == 'polygon' or self.status == 'fill_polygon':
             if self.temp_item is not None:
-                self.temp_item.p_list[-1] = [x, y]
+                self.temp_item.set_point(-1, [x, y])
         elif self.status == 'ellipse':
             if self.temp_item is not None:
-                self.temp_item.p_list[1] = [x, y]
+                self.temp_item.set_point(1, [x, y])
         elif self.status == 'curve':
             if self.temp_item is not None:
-                self.temp_item.p_list[-1] = [x, y]
-        elif self.status == 'translate':
-            self.temp_item.p_list = alg.translate(self.rawList, x - self.begin[0], y - self.begin[1])
+                self.temp_item.set_point(-1, [x, y])
+        elif self.status == 'translate':  # 拖动过程中只移动图元的位置，缓存的栅格化结果原样平移，松开鼠标时再修改参数
+            self.temp_item.setPos(x - self.begin[0], y - self.begin[1])
             # print(f"the p_list is {self.temp_item.p_list}")
         elif self.status == 'rotate':
             pass
@@ -274,7 +359,6 @@ class MyCanvas(QGraphicsView):
         elif self.status == 'clip' or self.status == 'clip_polygon':
             x0, y0 = self.temp_item.p_list[0]  # 裁剪矩形的一个顶点
             self.temp_item.p_list = [[x0, y0], [x0, y], [x, y], [x, y0]]  # 改变裁剪矩形框的顶点参数
-        self.updateScene([self.sceneRect()])
         super().mouseMoveEvent(event)
 
     def add_item(self):
@@ -304,11 +388,17 @@ class MyCanvas(QGraphicsView):
         elif self.status == 'curve':
             pass
         elif self.status == 'translate':
-            self.rawList = self.temp_item.p_list
+            offset = self.temp_item.pos()
+            if not offset.isNull():
+                self.temp_item.setPos(0, 0)
+                self.temp_item.add_transform(cg_scene.translation(int(offset.x()), int(offset.y())))
+            self.raw_state = self.temp_item.transform_state
         elif self.status == 'rotate':
-            self.rawList = self.temp_item.p_list
+            self.finish_lod()
+            self.raw_state = self.temp_item.transform_state
         elif self.status == 'scale':
-            self.rawList = self.temp_item.p_list
+            self.finish_lod()
+            self.raw_state = self.temp_item.transform_state
         elif self.status == 'clip':
             x_min, y_min = self.temp_item.p_list[0]
             x_max, y_max = self.temp_item.p_list[2]
@@ -332,13 +422,11 @@ class MyCanvas(QGraphicsView):
             self.scene().removeItem(self.temp_item)
             thepolygon = self.item_dict[self.selected_id]
             # print(f'!poly_list is {thepolygon.p_list}')
-            thepolygon.p_list = alg.clip_polygon(thepolygon.p_list,
-                                                 [[x_min, y_min], [x_min, y_max], [x_max, y_max], [x_max, y_min]])
+            thepolygon.p_list = vec.clip_polygon(thepolygon.p_list,
+                                                 [[x_min, y_min], [x_min, y_max], [x_max, y_max], [x_max, y_min]]).tolist()
             # print(f'!!poly_list is {thepolygon.p_list}')
-            self.updateScene([self.sceneRect()])
             if len(thepolygon.p_list) == 0:
                 self.delete_item()
-        self.updateScene([self.sceneRect()])
         super().mouseReleaseEvent(event)
 
     def wheelEvent(self, event: QtGui.QWheelEvent) -> None:  # 鼠标滚轮
@@ -354,7 +442,9 @@ class MyCanvas(QGraphicsView):
                 self.rotate_angle += 1
                 self.main_window.angle = self.rotate_angle
                 self.main_window.angle_box.setValue(self.rotate_angle)
-            self.temp_item.p_list = alg.rotate(self.rawList, self.begin[0], self.begin[1], self.rotate_angle)
+            self.start_lod()
+            self.temp_item.set_transform_state(self.raw_state)  # 每次都从操作开始时的状态复合总的旋转角度
+            self.temp_item.add_transform(cg_scene.rotation(self.rotate_angle), self.begin)
 
         elif self.status == 'scale':
             if event.angleDelta().y() > 0:
@@ -365,12 +455,13 @@ class MyCanvas(QGraphicsView):
                 self.scale_factor -= 0.1
                 self.main_window.factor = self.scale_factor
                 self.main_window.factor_box.setValue(self.scale_factor)
-            self.temp_item.p_list = alg.scale(self.rawList, self.begin[0], self.begin[1], self.scale_factor)
-
-        self.updateScene([self.sceneRect()])
+            self.start_lod()
+            self.temp_item.set_transform_state(self.raw_state)
+            self.temp_item.add_transform(cg_scene.scaling(self.scale_factor), self.begin)
 
     def clearCanvas(self):
         '''清空画布的所有图元，以及画布上的所有参数，用于重置画布时调用'''
+        self.finish_lod()
         for id in self.item_dict:
             self.scene().removeItem(self.item_dict[id])
         self.item_dict = {}
@@ -381,10 +472,9 @@ class MyCanvas(QGraphicsView):
         self.temp_id = ''
         self.temp_item = None
         self.begin = []  # 图形变换时选中的第一个控制点
-        self.rawList = []  # 图形变换时原图元控制参数
+        self.raw_state = NO_TRANSFORM  # 图形变换开始时图元的变换状态
         self.rotate_angle = 0  # 旋转角度
         self.scale_factor = 1  # 缩放比例
-        self.updateScene([self.sceneRect()])
 
 
 class MyItem(QGraphicsItem):
@@ -403,6 +493,18 @@ class MyItem(QGraphicsItem):
         :param parent:
         """
         super().__init__(parent)
+        self.raster_key = None  # 缓存的栅格化结果所对应的图元参数、算法、颜色和画笔宽度
+        self.dirty = True  # 图元参数改变后为True，此时才需要重新计算缓存键，否则直接使用缓存结果
+        self.raster = []  # 缓存的栅格化结果
+        self.preview_key = None  # 后台栅格化期间，当前的预览结果所对应的缓存键
+        self.job = None  # 正在后台栅格化的任务
+        self.job_key = None  # 后台任务所对应的缓存键
+        self.failed_key = None  # 后台任务出错时的缓存键，此后同样的参数直接在界面线程中栅格化
+        self.coarse = False  # 为True时只画粗略结果，用于交互式旋转、缩放
+        self.bounding_rect = QRectF()  # 由栅格化结果得到的包围盒，与栅格化结果一起缓存
+        self.image = None  # 由栅格化结果生成的离屏图像或点集，重绘时直接画出
+        self.image_origin = QPoint()  # 离屏图像左上角在场景中的位置
+        self.transform_state = NO_TRANSFORM  # 尚未作用于参数点的变换(shift, matrix, pivot)，见cg_scene.accumulate
         self.id = item_id  # 图元ID
         self.item_type = item_type  # 图元类型，'line'、'polygon'、'ellipse'、'curve'等
         self.p_list = p_list  # 图元参数
@@ -411,59 +513,218 @@ class MyItem(QGraphicsItem):
         self.color = color  # 画笔颜色
         self.width = width # 画笔宽度
 
+    @property
+    def p_list(self):
+        """作用变换后的图元参数，变换改变后第一次读取时计算，只舍入一次"""
+        if self._p_list is None:
+            shift, matrix, pivot = self.transform_state
+            points = np.array(self.base_list, np.int64).reshape(-1, 2)
+            self._p_list = cg_scene.apply_transform(points, matrix, pivot, shift).tolist()
+        return self._p_list
+
+    @p_list.setter
+    def p_list(self, p_list):  # 裁剪、修改裁剪框会整体替换p_list，此时缓存一定失效
+        self.prepareGeometryChange()  # 包围盒即将改变，场景据此重绘旧区域并更新索引
+        self.base_list = self._p_list = p_list
+        self.transform_state = NO_TRANSFORM
+        self.dirty = True
+        self.update()
+
+    def set_transform_state(self, state):
+        """设置尚未作用于参数点的变换，用于交互式变换时回到操作开始时的状态"""
+        self.prepareGeometryChange()
+        self.transform_state = state
+        self._p_list = self.base_list if state[1] is None and state[0] == (0, 0) else None
+        self.dirty = True
+        self.update()
+
+    def add_transform(self, transform, center=(0, 0)):
+        """在已有变换之后再做一次平移、旋转或缩放，只复合变换矩阵，不改写参数点
+
+        :param transform: (numpy.ndarray, shape (3, 3)) 以center为原点的变换矩阵，见cg_scene.translation等
+        :param center: (tuple of int) 变换的中心
+        """
+        self.set_transform_state(cg_scene.accumulate(self.transform_state, transform, center))
+
+    def set_point(self, index, point):
+        """修改第index个参数点，绘制过程中跟随鼠标移动时调用，只重绘图元前后所占的区域
+
+        :param index: (int) 参数点下标
+        :param point: (list of int) 新的参数点[x, y]
+        """
+        self.prepareGeometryChange()
+        self.base_list = self.p_list  # 先把变换作用于参数点，再修改
+        self.transform_state = NO_TRANSFORM
+        self._p_list[index] = point
+        self.dirty = True
+        self.update()
+
+    def add_point(self, point):
+        """在参数列表末尾增加一个参数点，用于多边形和曲线的绘制
+
+        :param point: (list of int) 新的参数点[x, y]
+        """
+        self.prepareGeometryChange()
+        self.base_list = self.p_list
+        self.transform_state = NO_TRANSFORM
+        self._p_list.append(point)
+        self.dirty = True
+        self.update()
+
+    def set_coarse(self, coarse):
+        """切换是否只画粗略结果：曲线只取少量采样点，填充多边形只画边框"""
+        if coarse != self.coarse:
+            self.prepareGeometryChange()
+            self.coarse = coarse
+            self.dirty = True
+            self.update()
+
+    def is_heavy(self):
+        """控制点多的曲线和面积大的填充多边形栅格化耗时较长，交给后台线程，避免界面卡顿"""
+        if self.item_type == 'curve':
+            return self.algorithm == 'B-spline' and len(self.p_list) >= HEAVY_CURVE_POINTS
+        if self.item_type == 'fill_polygon' and len(self.p_list) > 0:
+            x_list = [p[0] for p in self.p_list]
+            y_list = [p[1] for p in self.p_list]
+            return (max(x_list) - min(x_list)) * (max(y_list) - min(y_list)) >= HEAVY_FILL_AREA
+        return False
+
+    def preview(self, fmt):
+        """粗略的栅格化结果，用于后台栅格化完成前和交互式变换过程中的显示：
+        曲线只取少量采样点并用直线连接，填充多边形只画边框，其余图元本身绘制很快，直接精确绘制
+
+        :param fmt: (string) 输出格式，见alg.format_pixels
+        :return: (numpy.ndarray of int32 or list) 粗略的栅格化结果，每行与rasterize返回的列表元素含义相同
+        """
+        if self.item_type == 'curve':
+            return vec.draw_curve_coarse(self.p_list, self.algorithm, fmt=fmt)
+        if self.item_type == 'fill_polygon':
+            return vec.draw_polygon(self.p_list, 'DDA', fmt=fmt)
+        return rasterize_item(self.item_type, self.p_list, self.algorithm, fmt, self.ellipse())
+
+    def ellipse(self):
+        """图元变换后若是斜椭圆，返回其中心、半轴和旋转角，否则返回None"""
+        if self.item_type != 'ellipse':
+            return None
+        return cg_scene.ellipse_params(self.base_list, self.transform_state)
+
+    def rasterize(self, wait=False):
+        """栅格化图元，结果按图元参数、算法、颜色和画笔宽度缓存，这些都没有变化时重绘不再调用绘制算法。
+        耗时较长的图元交给后台线程，结果返回之前先返回预览结果
+
+        :param wait: (bool) 为True时不使用后台线程，直接算出精确结果
+        :return: (list of list of int) 画笔宽度为1时为水平区间[y, x_start, x_end]列表，否则为不重复的像素点列表
+        """
+        if not self.dirty and not wait:  # 参数没有改变，包括后台任务完成前正在显示预览的情况
+            return self.raster
+        self.dirty = False
+        key = (tuple(tuple(p) for p in self.p_list), self.ellipse(), self.item_type, self.algorithm, self.color.rgba(),
+               self.width, self.coarse)
+        if key == self.raster_key or (key == self.preview_key and not wait):
+            return self.raster
+        # 画笔宽度为1时把同一行上连续的像素合并成水平线绘制，否则每个像素都要画成宽度为width的方点
+        fmt = 'spans' if self.width == 1 else 'unique'
+        if wait and self.preview_key is not None:  # 用精确结果替换正在显示的预览，包围盒随之改变
+            self.prepareGeometryChange()
+            self.update()
+        self.cancel_job()
+        if not wait and self.coarse:
+            self.set_raster(key, self.preview(fmt))
+        elif not wait and self.is_heavy() and key != self.failed_key:
+            self.set_raster(None, self.preview(fmt))
+            self.job_key = self.preview_key = key  # 先记下缓存键，raster_ready据此判断结果是否过期
+            self.job = raster_worker.submit(self, key, self.item_type, self.p_list, self.algorithm, fmt)
+        else:
+            self.set_raster(key, rasterize_item(self.item_type, self.p_list, self.algorithm, fmt, self.ellipse()))
+        return self.raster
+
+    def cancel_job(self):
+        """放弃后台任务：还在排队的直接取消，已经开始的任务结果返回后会因为缓存键不符被丢弃"""
+        if self.job is not None:
+            self.job.cancel()
+            self.job = self.job_key = None
+        self.preview_key = None
+
+    def raster_ready(self, key, raster):
+        """后台任务完成时在界面线程中调用，图元参数已经改变的过期结果直接丢弃"""
+        if key != self.job_key:
+            return
+        self.prepareGeometryChange()
+        self.job = self.job_key = self.preview_key = None
+        if raster is None:  # 后台任务出错，下次重绘时在界面线程中栅格化，出错的话异常在那里抛出
+            self.failed_key = key
+            self.dirty = True
+        else:
+            self.set_raster(key, raster)
+        self.update()
+
+    def set_raster(self, key, raster):
+        self.raster = raster
+        self.raster_key = key
+        self.image = None
+        self.bounding_rect = self.raster_rect()
+
+    def raster_rect(self):
+        """由栅格化结果计算图元实际占据的矩形，包含画笔宽度和选中时的边框，只在图元参数改变后计算一次
+
+        :return: (QRectF) 图元的包围盒，没有像素时为空矩形
+        """
+        if len(self.raster) == 0:
+            return QRectF()
+        raster = np.array(self.raster)
+        if self.width == 1:
+            x_min, x_max = raster[:, 1].min(), raster[:, 2].max()
+            y_min, y_max = raster[:, 0].min(), raster[:, 0].max()
+        else:
+            x_min, y_min = raster.min(axis=0)
+            x_max, y_max = raster.max(axis=0)
+        margin = self.width // 2 + 1  # 宽度为width的点向两侧各延伸width // 2个像素，另留1个像素画选中边框
+        return QRectF(int(x_min) - margin, int(y_min) - margin,
+                      int(x_max - x_min) + 1 + 2 * margin, int(y_max - y_min) + 1 + 2 * margin)
+
+    def render(self):
+        """把栅格化结果转换成可以一次画出的形式：画笔宽度为1时由水平区间直接生成位图，
+        否则生成点集，用同一支画笔一次drawPoints画出（Qt画宽点的结果与位置有关，不能预先画到图像上再平移）
+
+        :return: (QImage or QPolygon) 图元的离屏图像（左上角位于self.image_origin）或点集，没有像素时返回None
+        """
+        raster = self.rasterize()
+        if self.image is not None or len(raster) == 0:
+            return self.image
+        if self.width == 1:
+            spans = np.array(raster)
+            x0, y0 = int(spans[:, 1].min()), int(spans[:, 0].min())
+            w, h = int(spans[:, 2].max()) - x0 + 1, int(spans[:, 0].max()) - y0 + 1
+            mask = np.zeros((h, (w + 31) // 32 * 32), bool)  # 单色位图每行按32位对齐
+            for y, x_start, x_end in spans - [y0, x0, x0]:
+                mask[y, x_start:x_end + 1] = True
+            bits = np.packbits(mask, axis=1).tobytes()  # QImage不复制数据，转换格式之前要保持bits存活
+            image = QImage(bits, w, h, mask.shape[1] // 8, QImage.Format_Mono)
+            image.setColorTable([0, self.color.rgba()])  # 0为透明，1为画笔颜色
+            # 转换为预乘alpha格式（同时复制出独立的数据），贴图时不必再逐像素查颜色表
+            self.image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+            self.image_origin = QPoint(x0, y0)
+        else:
+            self.image = QPolygon([QPoint(x, y) for x, y in raster])
+        return self.image
+
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = ...) -> None:
         if len(self.p_list) == 0: return
-        if self.item_type == 'line':
-            item_pixels = alg.draw_line(self.p_list, self.algorithm)
-        elif self.item_type == 'polygon':
-            item_pixels = alg.draw_polygon(self.p_list, self.algorithm)
-        elif self.item_type == 'fill_polygon':
-            item_pixels = alg.fill_polygon(self.p_list)
-        elif self.item_type == 'ellipse':
-            item_pixels = alg.draw_ellipse(self.p_list)
-        elif self.item_type == 'curve':
-            item_pixels = alg.draw_curve(self.p_list, self.algorithm)
-
-        for p in item_pixels:
+        image = self.render()
+        if isinstance(image, QImage):
+            painter.drawImage(self.image_origin, image)
+        elif image is not None:
             painter.setPen(QPen(self.color, self.width))
-            painter.drawPoint(*p)
+            painter.drawPoints(image)
         if self.selected:
             painter.setPen(QColor(255, 0, 0))
-            painter.drawRect(self.boundingRect())
-
-
-    def boundingRect(self, item_pixels=None) -> QRectF:
-        if len(self.p_list) == 0: return QRectF()
-        if self.item_type == 'line':
-            x0, y0 = self.p_list[0]
-            x1, y1 = self.p_list[1]
-            x = min(x0, x1)
-            y = min(y0, y1)
-            w = max(x0, x1) - x
-            h = max(y0, y1) - y
-            return QRectF(x - 1, y - 1, w + 2, h + 2)
-        elif self.item_type == 'polygon' or self.item_type == 'fill_polygon':
-            x_list = [p[0] for p in self.p_list]
-            y_list = [p[1] for p in self.p_list]
-            x_min, x_max = min(x_list), max(x_list)
-            y_min, y_max = min(y_list), max(y_list)
-            return QRectF(x_min - 1, y_min - 1, x_max - x_min + 2, y_max - y_min + 2)
-
-        elif self.item_type == 'ellipse':
-            x0, y0 = self.p_list[0]
-            x1, y1 = self.p_list[1]
-            x = min(x0, x1)
-            y = min(y0, y1)
-            w = max(x0, x1) - x
-            h = max(y0, y1) - y
-            return QRectF(x - 1, y - 1, w + 2, h + 2)
-
-        elif self.item_type == 'curve':
-            x_list = [p[0] for p in self.p_list]
-            y_list = [p[1] for p in self.p_list]
-            x_min, x_max = min(x_list), max(x_list)
-            y_min, y_max = min(y_list), max(y_list)
-            return QRectF(x_min - 1, y_min - 1, x_max - x_min + 2, y_max - y_min + 2)
+            painter.drawRect(self.boundingRect().adjusted(0, 0, -1, -1))  # 右、下边框画在包围盒内，局部重绘时才能擦除干净
+
+
+    def boundingRect(self) -> QRectF:
+        if self.dirty:  # 只在图元参数改变后重新栅格化，Qt每帧会多次调用boundingRect
+            self.rasterize()
+        return self.bounding_rect
 
 
 class MainWindow(QMainWindow):
@@ -628,7 +889,7 @@ class MainWindow(QMainWindow):
             self.canvas_widget.scale_factor = 1
             # self.angle_box.setValue(0)
             # self.factor_box.setValue(1)
-            self.canvas_widget.rawList = self.canvas_widget.temp_item.p_list
+            self.canvas_widget.raw_state = self.canvas_widget.temp_item.transform_state
 
     def change_beginy(self):
         # print(f'y in box is {self.beginy_box.value()}')
@@ -642,7 +903,7 @@ class MainWindow(QMainWindow):
             self.canvas_widget.scale_factor = 1
             # self.angle_box.setValue(0)
             # self.factor_box.setValue(1)
-            self.canvas_widget.rawList = self.canvas_widget.temp_item.p_list
+            self.canvas_widget.raw_state = self.canvas_widget.temp_item.transform_state
 
     def change_angle(self):
         if self.canvas_widget.selected_id == '':
@@ -658,10 +919,11 @@ class MainWindow(QMainWindow):
                 self.rotate_action()
             self.canvas_widget.rotate_angle = self.angle_box.value()
             # print(f"the angle after changing is {self.canvas_widget.rotate_angle}")
-            # self.canvas_widget.rawList = self.canvas_widget.temp_item.p_list
-            self.canvas_widget.temp_item.p_list = alg.rotate(self.canvas_widget.rawList, self.beginx,
-                                                             self.beginy, self.angle_box.value())
-            self.canvas_widget.updateScene([self.canvas_widget.sceneRect()])
+            # self.canvas_widget.raw_state = self.canvas_widget.temp_item.transform_state
+            self.canvas_widget.start_lod()
+            self.canvas_widget.temp_item.set_transform_state(self.canvas_widget.raw_state)
+            self.canvas_widget.temp_item.add_transform(cg_scene.rotation(self.angle_box.value()),
+                                                       (self.beginx, self.beginy))
 
     def change_factor(self):
         if self.canvas_widget.selected_id == '':
@@ -676,10 +938,11 @@ class MainWindow(QMainWindow):
             if self.canvas_widget.temp_item is None:
                 self.scale_action()
             self.canvas_widget.scale_factor = self.factor_box.value()
-            # self.canvas_widget.rawList = self.canvas_widget.temp_item.p_list
-            self.canvas_widget.temp_item.p_list = alg.scale(self.canvas_widget.rawList, self.beginx,
-                                                            self.beginy, self.factor_box.value())
-            self.canvas_widget.updateScene([self.canvas_widget.sceneRect()])
+            # self.canvas_widget.raw_state = self.canvas_widget.temp_item.transform_state
+            self.canvas_widget.start_lod()
+            self.canvas_widget.temp_item.set_transform_state(self.canvas_widget.raw_state)
+            self.canvas_widget.temp_item.add_transform(cg_scene.scaling(self.factor_box.value()),
+                                                       (self.beginx, self.beginy))
 
     def get_id(self):
         _id = str(self.item_cnt)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_cli指令文件的流式解析：逐行读取，每条指令解析成一个命名元组，由生成器逐条产出，
+# 文件再大也只占常数内存；格式错误时抛出带行号的ParseError，不退出程序
+import collections
+import sys
+
+ResetCanvas = collections.namedtuple('ResetCanvas', ['width', 'height', 'line_no'])
+SaveCanvas = collections.namedtuple('SaveCanvas', ['name', 'line_no'])
+SetColor = collections.namedtuple('SetColor', ['r', 'g', 'b', 'line_no'])
+DrawLine = collections.namedtuple('DrawLine', ['item_id', 'p_list', 'algorithm', 'line_no'])
+DrawPolygon = collections.namedtuple('DrawPolygon', ['item_id', 'p_list', 'algorithm', 'line_no'])
+FillPolygon = collections.namedtuple('FillPolygon', ['item_id', 'p_list', 'line_no'])
+DrawEllipse = collections.namedtuple('DrawEllipse', ['item_id', 'p_list', 'line_no'])
+DrawCurve = collections.namedtuple('DrawCurve', ['item_id', 'p_list', 'algorithm', 'line_no'])
+Translate = collections.namedtuple('Translate', ['item_id', 'dx', 'dy', 'line_no'])
+Rotate = collections.namedtuple('Rotate', ['item_id', 'x', 'y', 'r', 'line_no'])
+Scale = collections.namedtuple('Scale', ['item_id', 'x', 'y', 's', 'line_no'])
+Clip = collections.namedtuple('Clip', ['item_id', 'x_min', 'y_min', 'x_max', 'y_max', 'algorithm', 'line_no'])
+
+
+class ParseError(ValueError):
+    """指令格式错误，line_no为出错的行号（从1开始）"""
+
+    def __init__(self, line_no, message):
+        super().__init__(f'line {line_no}: {message}')
+        self.line_no = line_no
+
+
+def parse_points(tokens):
+    """把坐标记号序列x0 y0 x1 y1 ...解析为[[x0, y0], [x1, y1], ...]"""
+    if len(tokens) % 2 != 0:
+        raise ValueError(f'expected an even number of coordinates, got {len(tokens)}')
+    it = iter(tokens)
+    return [[int(x), int(y)] for x, y in zip(it, it)]
+
+
+def parse_reset_canvas(args, line_no):
+    width, height = args
+    return ResetCanvas(int(width), int(height), line_no)
+
+
+def parse_save_canvas(args, line_no):
+    name, = args
+    return SaveCanvas(name, line_no)
+
+
+def parse_set_color(args, line_no):
+    r, g, b = args
+    return SetColor(int(r), int(g), int(b), line_no)
+
+
+def parse_draw_line(args, line_no):
+    item_id, x0, y0, x1, y1, algorithm = args
+    return DrawLine(item_id, [[int(x0), int(y0)], [int(x1), int(y1)]], algorithm, line_no)
+
+
+def parse_draw_polygon(args, line_no):
+    if len(args) < 2:
+        raise ValueError('missing item id or algorithm')
+    return DrawPolygon(args[0], parse_points(args[1:-1]), args[-1], line_no)
+
+
+def parse_fill_polygon(args, line_no):
+    if len(args) < 1:
+        raise ValueError('missing item id')
+    return FillPolygon(args[0], parse_points(args[1:]), line_no)
+
+
+def parse_draw_ellipse(args, line_no):
+    item_id, x0, y0, x1, y1 = args
+    return DrawEllipse(item_id, [[int(x0), int(y0)], [int(x1), int(y1)]], line_no)
+
+
+def parse_draw_curve(args, line_no):
+    if len(args) < 2:
+        raise ValueError('missing item id or algorithm')
+    return DrawCurve(args[0], parse_points(args[1:-1]), args[-1], line_no)
+
+
+def parse_translate(args, line_no):
+    item_id, dx, dy = args
+    return Translate(item_id, int(dx), int(dy), line_no)
+
+
+def parse_rotate(args, line_no):
+    item_id, x, y, r = args
+    return Rotate(item_id, int(x), int(y), float(r), line_no)
+
+
+def parse_scale(args, line_no):
+    item_id, x, y, s = args
+    return Scale(item_id, int(x), int(y), float(s), line_no)
+
+
+def parse_clip(args, line_no):
+    item_id, x_min, y_min, x_max, y_max, algorithm = args
+    return Clip(item_id, int(x_min), int(y_min), int(x_max), int(y_max), algorithm, line_no)
+
+
+parser_dict = {
+    'resetCanvas': parse_reset_canvas,
+    'saveCanvas': parse_save_canvas,
+    'setColor': parse_set_color,
+    'drawLine': parse_draw_line,
+    'drawPolygon': parse_draw_polygon,
+    'fillPolygon': parse_fill_polygon,
+    'drawEllipse': parse_draw_ellipse,
+    'drawCurve': parse_draw_curve,
+    'translate': parse_translate,
+    'rotate': parse_rotate,
+    'scale': parse_scale,
+    'clip': parse_clip,
+}
+
+
+def parse_commands(lines):
+    """逐行解析指令，空行跳过，记号之间可以有任意多个空白字符
+
+    :param lines: (iterable of str) 指令文件的各行，例如打开的文件对象
+    :return: (generator of namedtuple) 逐条产出的指令记录，line_no为指令所在的行号
+    """
+    for line_no, line in enumerate(lines, 1):
+        tokens = line.split()
+        if not tokens:
+            continue
+        parser = parser_dict.get(tokens[0])
+        if parser is None:
+            raise ParseError(line_no, f'unknown command {tokens[0]!r}')
+        try:
+            command = parser(tokens[1:], line_no)
+        except ValueError as e:  # 参数个数不对时解包也抛出ValueError
+            raise ParseError(line_no, f'{tokens[0]}: {e}') from None
+        yield command
+
+
+def parse_file(path):
+    """流式解析指令文件
+
+    :param path: (string) 指令文件路径，'-'表示标准输入
+    :return: (generator of namedtuple) 逐条产出的指令记录
+    """
+    if path == '-':
+        yield from parse_commands(sys.stdin)
+        return
+    with open(path, 'r') as fp:
+        yield from parse_commands(fp)
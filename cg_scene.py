@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 紧凑的场景存储：图元记录使用__slots__，所有图元的顶点坐标连续存放在同一个numpy缓冲区里，
+# 每个图元只记录自己在缓冲区中的起始下标和顶点数，批量变换、批量绘制可以直接作用于整个缓冲区。
+# 平移、旋转、缩放不改写顶点，只把3x3仿射矩阵复合到图元上（O(1)），绘制时才作用于顶点并只舍入一次
+import math
+
+import numpy as np
+
+
+def translation(dx, dy):
+    """平移(dx, dy)的变换矩阵"""
+    return np.array([[1.0, 0.0, dx], [0.0, 1.0, dy], [0.0, 0.0, 1.0]])
+
+
+def rotation(r):
+    """以中心点为原点顺时针旋转r度的变换矩阵，与cg_algorithms.rotate相同"""
+    theta = math.radians(r)
+    cos, sin = math.cos(theta), math.sin(theta)
+    return np.array([[cos, -sin, 0.0], [sin, cos, 0.0], [0.0, 0.0, 1.0]])
+
+
+def scaling(s):
+    """以中心点为原点缩放s倍的变换矩阵"""
+    return np.array([[s, 0.0, 0.0], [0.0, s, 0.0], [0.0, 0.0, 1.0]])
+
+
+def compose(matrix, pivot, transform, center):
+    """在已有变换之后再做一次变换
+
+    变换用(matrix, pivot)表示：p -> pivot + matrix * (p - pivot)（齐次坐标）。图元的第一个变换直接取它自己的
+    中心作为pivot，这样只做一次旋转或缩放时，apply_transform的运算顺序与cg_algorithms完全相同。
+    :param matrix: (numpy.ndarray, shape (3, 3) or None) 已有变换，None表示没有变换（或只有整数平移，见SceneItem.shift）
+    :param pivot: (tuple of float) 已有变换的中心
+    :param transform: (numpy.ndarray, shape (3, 3)) 新的变换，以center为原点
+    :param center: (tuple of float) 新变换的中心，平移为(0, 0)
+    :return: (tuple: (matrix, pivot)) 复合后的变换
+    """
+    if matrix is None:
+        return transform, center
+    shift = translation(center[0] - pivot[0], center[1] - pivot[1])
+    back = translation(pivot[0] - center[0], pivot[1] - center[1])
+    return shift @ transform @ back @ matrix, pivot
+
+
+def accumulate(state, transform, center=(0, 0)):
+    """在变换状态(shift, matrix, pivot)之后再做一次变换，第一次旋转或缩放之前的整数平移只累加到shift上
+
+    :param state: (tuple: (shift, matrix, pivot)) 已有的变换状态，没有变换时为((0, 0), None, (0, 0))
+    :param transform: (numpy.ndarray, shape (3, 3)) 新的变换，以center为原点
+    :param center: (tuple of int) 新变换的中心，平移为(0, 0)
+    :return: (tuple: (shift, matrix, pivot)) 新的变换状态
+    """
+    shift, matrix, pivot = state
+    dx, dy = transform[0, 2], transform[1, 2]
+    if matrix is None and (transform[:2, :2] == np.eye(2)).all() and dx == int(dx) and dy == int(dy):
+        return (shift[0] + int(dx), shift[1] + int(dy)), None, pivot
+    return (shift,) + compose(matrix, pivot, transform, center)
+
+
+def apply_transform(points, matrix, pivot, shift=(0, 0)):
+    """把变换作用于顶点，结果舍入到整数（与round相同，0.5舍入到偶数）
+
+    :param points: (numpy.ndarray of int, shape (N, 2)) 原始顶点
+    :param shift: (tuple of int) 在matrix之前做的整数平移
+    :return: (numpy.ndarray of int64, shape (N, 2)) 变换后的顶点
+    """
+    if matrix is None:
+        return points + shift
+    dx = points[:, 0] + (shift[0] - pivot[0])  # 整数运算，没有误差
+    dy = points[:, 1] + (shift[1] - pivot[1])
+    x = pivot[0] + matrix[0, 0] * dx + matrix[0, 1] * dy + matrix[0, 2]
+    y = pivot[1] + matrix[1, 0] * dx + matrix[1, 1] * dy + matrix[1, 2]
+    return np.column_stack((np.rint(x), np.rint(y))).astype(np.int64)
+
+
+def ellipse_params(p_list, state):
+    """由椭圆的矩形包围框和变换状态求旋转后的椭圆
+
+    旋转、缩放、平移复合起来是相似变换，椭圆变换后仍是椭圆：中心随变换移动，半轴乘以缩放倍数，
+    方向转过矩阵的旋转角。只转过90度整数倍时返回None，此时仍按变换后的包围框用cg_algorithms.draw_ellipse绘制。
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的原始包围框
+    :param state: (tuple: (shift, matrix, pivot)) 变换状态，见accumulate
+    :return: (tuple: (center, a, b, angle) or None) 参数含义见cg_vectorized.draw_rotated_ellipse
+    """
+    shift, matrix, pivot = state
+    if matrix is None:
+        return None
+    angle = math.degrees(math.atan2(matrix[1, 0], matrix[0, 0]))
+    if abs(angle / 90 - round(angle / 90)) < 1e-9:
+        return None
+    (x0, y0), (x1, y1) = p_list
+    # 半轴长和中心与cg_algorithms.draw_ellipse的取法相同
+    a, b = int(abs(x1 - x0) / 2), int(abs(y0 - y1) / 2)
+    dx, dy = int((x0 + x1) / 2) + shift[0] - pivot[0], int((y0 + y1) / 2) + shift[1] - pivot[1]
+    center = (pivot[0] + matrix[0, 0] * dx + matrix[0, 1] * dy + matrix[0, 2],
+              pivot[1] + matrix[1, 0] * dx + matrix[1, 1] * dy + matrix[1, 2])
+    factor = math.hypot(matrix[0, 0], matrix[1, 0])
+    return center, a * factor, b * factor, angle
+
+
+class SceneItem:
+    """
+    场景中的一个图元，原始顶点坐标为所属Scene.coords[offset:offset + count]，先平移shift，再经过(matrix, pivot)变换
+    """
+
+    __slots__ = ('item_type', 'algorithm', 'color', 'offset', 'count', 'shift', 'matrix', 'pivot')
+
+    def __init__(self, item_type, algorithm, color, offset, count, shift=(0, 0), matrix=None, pivot=(0, 0)):
+        self.item_type = item_type  # 图元类型，'line'、'polygon'、'fill_polygon'、'ellipse'、'curve'
+        self.algorithm = algorithm  # 绘制算法，没有时为None
+        self.color = color  # 画笔颜色(r, g, b)，同一颜色的图元共用同一个元组
+        self.offset = offset  # 顶点在坐标缓冲区中的起始下标
+        self.count = count  # 顶点数
+        self.shift = shift  # 第一次旋转或缩放之前累计的整数平移，整数运算没有误差，因此单独记录
+        self.matrix = matrix  # 尚未作用于顶点的3x3仿射矩阵，None表示没有旋转或缩放，见compose
+        self.pivot = pivot  # 变换的中心
+
+
+class Scene:
+    """
+    按加入顺序保存的图元集合，顶点坐标存放在一个 (capacity, 2) 的int64缓冲区里
+    """
+
+    def __init__(self, capacity=1024):
+        self.items = {}  # 图元ID -> SceneItem，字典保持图元加入的顺序
+        self.coords = np.empty((capacity, 2), np.int64)  # 所有图元的顶点坐标
+        self.used = 0  # 缓冲区中已经分配出去的顶点数
+        self.garbage = 0  # 已分配但不再被任何图元使用的顶点数（图元被替换或顶点数改变后留下）
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    def __getitem__(self, item_id):
+        return self.items[item_id]
+
+    def add(self, item_id, item_type, p_list, algorithm, color):
+        """加入图元，ID已存在时替换原图元，但保持原来的绘制顺序
+
+        :param p_list: (list of list of int or numpy.ndarray) 图元参数
+        :param color: (tuple of int: (r, g, b)) 画笔颜色
+        """
+        old = self.items.get(item_id)
+        if old is not None:
+            self.garbage += old.count
+            old.count = 0  # 防止分配时整理缓冲区，把旧顶点当作有效数据保留
+        points = np.asarray(p_list, np.int64).reshape(-1, 2)
+        self.items[item_id] = SceneItem(item_type, algorithm, color, self.alloc(points), len(points))
+
+    def vertices(self, item_id):
+        """图元的原始顶点坐标（不含尚未作用的变换），为坐标缓冲区的视图，不复制
+
+        :return: (numpy.ndarray of int64, shape (count, 2))
+        """
+        item = self.items[item_id]
+        return self.coords[item.offset:item.offset + item.count]
+
+    def p_list(self, item_id):
+        """图元参数（已作用变换并舍入），与cg_algorithms中的p_list格式相同
+
+        :return: (list of list of int: [[x0, y0], [x1, y1], ...])
+        """
+        item = self.items[item_id]
+        return apply_transform(self.vertices(item_id), item.matrix, item.pivot, item.shift).tolist()
+
+    def ellipse(self, item_id):
+        """旋转过的椭圆的参数，其余图元和没有旋转过的椭圆返回None，见ellipse_params"""
+        item = self.items[item_id]
+        if item.item_type != 'ellipse' or item.matrix is None:
+            return None
+        return ellipse_params(self.vertices(item_id).tolist(), (item.shift, item.matrix, item.pivot))
+
+    def transform(self, item_id, transform, center=(0, 0)):
+        """对图元做一次仿射变换，只复合矩阵，不改写顶点
+
+        :param transform: (numpy.ndarray, shape (3, 3)) 以center为原点的变换矩阵，见translation、rotation、scaling
+        :param center: (tuple of int) 变换的中心
+        """
+        item = self.items[item_id]
+        item.shift, item.matrix, item.pivot = accumulate((item.shift, item.matrix, item.pivot), transform, center)
+
+    def set_p_list(self, item_id, p_list):
+        """修改图元参数：顶点数不变时原地写回缓冲区，否则重新分配；尚未作用的变换一并清除"""
+        item = self.items[item_id]
+        item.shift, item.matrix, item.pivot = (0, 0), None, (0, 0)
+        points = np.asarray(p_list, np.int64).reshape(-1, 2)
+        if len(points) == item.count:
+            self.coords[item.offset:item.offset + item.count] = points
+            return
+        self.garbage += item.count
+        item.count = 0
+        item.offset = self.alloc(points)
+        item.count = len(points)
+
+    def alloc(self, points):
+        """在缓冲区末尾放入一组顶点，空间不足时先整理掉不再使用的顶点，仍不够再把缓冲区扩大一倍
+
+        :return: (int) 这组顶点的起始下标
+        """
+        if self.used + len(points) > len(self.coords):
+            if self.garbage * 2 >= self.used:
+                self.compact()
+            if self.used + len(points) > len(self.coords):
+                coords = np.empty((max(2 * len(self.coords), self.used + len(points)), 2), np.int64)
+                coords[:self.used] = self.coords[:self.used]
+                self.coords = coords
+        offset = self.used
+        self.coords[offset:offset + len(points)] = points
+        self.used += len(points)
+        return offset
+
+    def compact(self):
+        """按图元顺序重新排列顶点，去掉不再使用的部分，之后各图元的顶点在缓冲区中首尾相接"""
+        counts = np.fromiter((item.count for item in self.items.values()), np.int64, len(self.items))
+        offsets = np.fromiter((item.offset for item in self.items.values()), np.int64, len(self.items))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else counts
+        # 第i个图元的第j个顶点从offsets[i] + j移到starts[i] + j
+        index = np.repeat(offsets - starts, counts) + np.arange(counts.sum())
+        self.coords[:len(index)] = self.coords[index]
+        for item, start in zip(self.items.values(), starts.tolist()):
+            item.offset = start
+        self.used = len(index)
+        self.garbage = 0
+
+    def packed(self):
+        """整理缓冲区并返回所有图元的顶点，供批量变换和批量绘制使用
+
+        :return: (tuple: (coords, offsets)) coords为 (N, 2) 的顶点数组（缓冲区的视图，修改会写回场景），
+                 offsets为长度len(self) + 1的int64数组，第i个图元的顶点为coords[offsets[i]:offsets[i + 1]]
+        """
+        counts = np.fromiter((item.count for item in self.items.values()), np.int64, len(self.items))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        current = np.fromiter((item.offset for item in self.items.values()), np.int64, len(self.items))
+        if self.used != offsets[-1] or (current != offsets[:-1])[counts > 0].any():  # 有空洞或者顺序不对
+            self.compact()
+        return self.coords[:self.used], offsets
+
+    def set_packed(self, coords):
+        """用批量变换的结果整体替换所有图元的顶点（见cg_vectorized.translate_items等），尚未作用的变换一并清除
+
+        :param coords: (numpy.ndarray of int, shape (N, 2)) 与materialized()返回的顶点一一对应
+        """
+        packed, offsets = self.packed()
+        packed[:] = coords
+        for item in self.items.values():
+            item.shift, item.matrix, item.pivot = (0, 0), None, (0, 0)
+
+    def materialized(self):
+        """所有图元作用变换后的顶点，用于批量绘制
+
+        :return: (tuple: (coords, offsets)) 含义同packed()，coords为新数组，修改不影响场景
+        """
+        coords, offsets = self.packed()
+        coords = coords.copy()
+        for index, item in enumerate(self.items.values()):
+            if item.matrix is not None or item.shift != (0, 0):
+                start, end = offsets[index], offsets[index + 1]
+                coords[start:end] = apply_transform(coords[start:end], item.matrix, item.pivot, item.shift)
+        return coords, offsets
+
+    def copy(self):
+        """复制出一个独立的、已整理的场景，之后修改原场景不影响副本"""
+        coords, offsets = self.packed()
+        scene = Scene(0)
+        scene.coords = coords.copy()
+        scene.used = len(coords)
+        scene.items = {item_id: SceneItem(item.item_type, item.algorithm, item.color, item.offset, item.count,
+                                          item.shift, item.matrix, item.pivot)
+                       for item_id, item in self.items.items()}
+        return scene
@@ -0,0 +1,546 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_algorithms的numpy向量化实现（cg_algorithms本身只允许依赖math库，因此单独成文件）
+# 与cg_algorithms的对应关系：
+# - draw_line、draw_lines、draw_polygon、draw_ellipse：(N, 2) 的int32像素数组，像素点及其顺序与cg_algorithms完全一致
+# - draw_curve：Bezier曲线完全一致；B样条曲线去掉了相邻的重复像素，'unique'和'spans'格式的结果完全一致
+# - format_pixels：含义同cg_algorithms.format_pixels，'spans'格式返回 (K, 3) 的区间数组
+# - clip_polygon、translate_items、rotate_items、scale_items：int64坐标数组，与逐个调用cg_algorithms的结果一致
+# - draw_curve_coarse、draw_rotated_ellipse：cg_algorithms中没有对应函数，前者只是近似结果
+import functools
+import math
+
+import numpy as np
+
+import cg_algorithms as alg
+
+CURVE_SAMPLES = 1001  # 与cg_algorithms.draw_curve相同，每段曲线取u = 0, 0.001, ..., 1
+CHUNK_CELLS = 1 << 20  # 分段累加时每块补齐后的最大元素个数，限制临时内存
+COARSE_SAMPLES = 33  # draw_curve_coarse默认每段曲线的采样点数
+SMALL_BATCH = 16  # 线段不超过这么多条时draw_lines逐条绘制，避免批量计算中几十次numpy调用的固定开销
+ELLIPSE_CACHE_SIZE = 256  # 最多缓存多少种不同形状的椭圆，超过时淘汰最久未使用的
+ELLIPSE_CACHE_PIXELS = 1 << 14  # 估计像素数超过此值的椭圆不进缓存，每个缓存最多占用约256 * 16384 * 8B = 32MB
+
+
+def _empty():
+    return np.empty((0, 2), np.int32)
+
+
+def format_pixels(pixels, fmt='points'):
+    """整理绘制结果的像素数组，含义与cg_algorithms.format_pixels相同
+
+    :param pixels: (numpy.ndarray of int, shape (N, 2)) 像素点坐标
+    :param fmt: (string) 'points'原样返回；'unique'去掉重复的像素点，保留首次出现的顺序；
+                'spans'把同一行上连续的像素合并为水平区间[y, x_start, x_end]，按y、x从小到大排列
+    :return: (numpy.ndarray of int32) 'points'和'unique'为 (N, 2) 的像素数组，'spans'为 (K, 3) 的区间数组
+    """
+    if fmt == 'points':
+        return pixels
+    if fmt != 'unique' and fmt != 'spans':
+        raise ValueError(f'unknown pixel format: {fmt}')
+    if len(pixels) == 0:
+        return np.empty((0, 2 if fmt == 'unique' else 3), np.int32)
+    xs, ys = pixels[:, 0].astype(np.int64), pixels[:, 1].astype(np.int64)
+    x_min = xs.min()
+    span = xs.max() - x_min + 2  # 多留一列，保证不同行的像素在编码后不会相邻
+    keys, first = np.unique((ys - ys.min()) * span + (xs - x_min), return_index=True)
+    if fmt == 'unique':
+        return pixels[np.sort(first)].astype(np.int32)
+    starts = np.ones(len(keys), bool)
+    starts[1:] = np.diff(keys) != 1
+    begin = np.flatnonzero(starts)
+    end = np.append(begin[1:], len(keys)) - 1
+    rows = pixels[first, 1]
+    cols = pixels[first, 0]
+    return np.column_stack((rows[begin], cols[begin], cols[end])).astype(np.int32)
+
+
+def _segmented_accumulate(start, step, count):
+    """对每一段分别按 v = start; v += step 的顺序逐项累加count个浮点数
+
+    结果与逐像素循环的舍入误差完全相同。各段按长度分到2的幂次的桶里，同一桶内补齐成矩阵后沿行做cumsum，
+    补齐浪费不超过一倍。
+    :param start: (numpy.ndarray of float64, shape (M,)) 每段的初值
+    :param step: (numpy.ndarray of float64, shape (M,)) 每段的步长
+    :param count: (numpy.ndarray of int, shape (M,)) 每段的项数
+    :return: (numpy.ndarray of float64) 各段结果按顺序拼接
+    """
+    if len(count) == 1:
+        seq = np.full(int(count[0]), step[0], np.float64)
+        seq[0] = start[0]
+        return np.cumsum(seq)
+    offsets = np.zeros(len(count) + 1, np.int64)
+    np.cumsum(count, out=offsets[1:])
+    result = np.empty(offsets[-1], np.float64)
+    bucket = np.ceil(np.log2(np.maximum(count, 1))).astype(np.int64)
+    for b in np.unique(bucket):
+        members = np.flatnonzero(bucket == b)
+        width = int(count[members].max())
+        cols = np.arange(width)
+        rows_per_chunk = max(1, CHUNK_CELLS // width)
+        for lo in range(0, len(members), rows_per_chunk):
+            rows = members[lo:lo + rows_per_chunk]
+            seq = np.repeat(step[rows, None], width, axis=1)
+            seq[:, 0] = start[rows]
+            np.cumsum(seq, axis=1, out=seq)
+            mask = cols[None, :] < count[rows, None]
+            result[(offsets[rows, None] + cols[None, :])[mask]] = seq[mask]
+    return result
+
+
+def draw_lines(segments, algorithm):
+    """批量绘制线段
+
+    :param segments: (array-like of int, shape (M, 4): [[x0, y0, x1, y1], ...]) M条线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'（'Naive'逐条绘制）
+    :return: (tuple: (pixels, offsets)) pixels为 (N, 2) 的int32像素数组，offsets为长度M+1的int64数组，
+             第i条线段的像素为pixels[offsets[i]:offsets[i + 1]]，与cg_algorithms.draw_line逐条绘制的结果一致
+    """
+    seg = np.asarray(segments, np.int64).reshape(-1, 4)
+    if algorithm != 'Naive' and algorithm != 'DDA' and algorithm != 'Bresenham':
+        return _empty(), np.zeros(len(seg) + 1, np.int64)
+    if algorithm == 'Naive' or len(seg) <= SMALL_BATCH:
+        if algorithm == 'Naive':
+            parts = [_draw_naive(s) for s in seg]
+        else:
+            parts = [_draw_segment(*s, algorithm) for s in seg.tolist()]
+        offsets = np.zeros(len(parts) + 1, np.int64)
+        np.cumsum([len(p) for p in parts], out=offsets[1:])
+        return (np.concatenate(parts) if len(parts) > 1 else parts[0] if parts else _empty()), offsets
+
+    x0, y0, x1, y1 = seg.T
+    dx, dy = np.abs(x1 - x0), np.abs(y1 - y0)
+    steep = dy > dx  # |k| > 1时以y为步进方向
+    # 以u为步进方向、v为另一方向，并保证u递增
+    u0, v0, u1, v1 = np.where(steep, y0, x0), np.where(steep, x0, y0), np.where(steep, y1, x1), np.where(steep, x1, y1)
+    back = u0 > u1
+    u0, v0, u1, v1 = np.where(back, u1, u0), np.where(back, v1, v0), np.where(back, u0, u1), np.where(back, v0, v1)
+    du, dv = u1 - u0, np.abs(v1 - v0)
+    count = du + 1
+
+    offsets = np.zeros(len(seg) + 1, np.int64)
+    np.cumsum(count, out=offsets[1:])
+    steps = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1], count)
+    u = np.repeat(u0, count) + steps
+
+    if algorithm == 'Bresenham':
+        # 第i步之前v共前进了 floor((2dv*i + du - 1) / 2du) 次，与逐步判断p_k的结果相同
+        s = np.where(dv == 0, 0, np.where(v0 < v1, 1, -1))
+        moved = np.repeat(2 * dv, count) * steps + np.repeat(du - 1, count)
+        moved //= np.repeat(np.maximum(2 * du, 1), count)
+        v = np.repeat(v0, count) + np.repeat(s, count) * moved
+    else:
+        # DDA: 水平/竖直线直接取整数坐标，其余线段沿u方向累加斜率后四舍五入
+        general = (dx != 0) & (dy != 0)
+        v = np.repeat(v0, count)
+        if general.any():
+            idx = np.flatnonzero(general)
+            k = (y1[idx] - y0[idx]) / (x1[idx] - x0[idx])
+            step = np.where(steep[idx], 1 / k, k)
+            picked = np.repeat(general, count)
+            v[picked] = np.rint(_segmented_accumulate(v0[idx].astype(np.float64), step, count[idx]))
+
+    pixels = np.empty((offsets[-1], 2), np.int32)
+    steep_px = np.repeat(steep, count)
+    pixels[:, 0] = np.where(steep_px, v, u)
+    pixels[:, 1] = np.where(steep_px, u, v)
+    return pixels, offsets
+
+
+def _draw_segment(x0, y0, x1, y1, algorithm):
+    """逐条绘制时的单条线段，步进方向等判断用Python标量完成，与批量计算的结果相同"""
+    steep = abs(y1 - y0) > abs(x1 - x0)
+    u0, v0, u1, v1 = (y0, x0, y1, x1) if steep else (x0, y0, x1, y1)
+    if u0 > u1:
+        u0, v0, u1, v1 = u1, v1, u0, v0
+    du, dv = u1 - u0, abs(v1 - v0)
+    pixels = np.empty((du + 1, 2), np.int32)
+    pixels[:, int(steep)] = np.arange(u0, u1 + 1)
+    if dv == 0:  # 水平或竖直的线段
+        pixels[:, 1 - steep] = v0
+    elif algorithm == 'Bresenham':
+        # 第i步之前v共前进了 floor((2dv*i + du - 1) / 2du) 次
+        moved = np.arange(du - 1, du - 1 + 2 * dv * (du + 1), 2 * dv) // (2 * du)
+        pixels[:, 1 - steep] = v0 + moved if v0 < v1 else v0 - moved
+    else:
+        k = (y1 - y0) / (x1 - x0)
+        seq = np.full(du + 1, 1 / k if steep else k)
+        seq[0] = v0
+        pixels[:, 1 - steep] = np.rint(np.cumsum(seq, out=seq), out=seq)
+    return pixels
+
+
+def _draw_naive(segment):
+    x0, y0, x1, y1 = (int(c) for c in segment)
+    if x0 == x1:
+        ys = np.arange(y0, y1 + 1)
+        return np.column_stack((np.full(len(ys), x0), ys)).astype(np.int32)
+    if x0 > x1:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+    k = (y1 - y0) / (x1 - x0)
+    xs = np.arange(x0, x1 + 1)
+    ys = np.trunc(y0 + k * (xs - x0).astype(np.float64))
+    return np.column_stack((xs, ys)).astype(np.int32)
+
+
+def draw_line(p_list, algorithm, fmt='points'):
+    """绘制线段（向量化版本）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
+    :return: (numpy.ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标，与cg_algorithms.draw_line一致
+    """
+    (x0, y0), (x1, y1) = p_list[0], p_list[1]
+    return format_pixels(draw_lines([[x0, y0, x1, y1]], algorithm)[0], fmt)
+
+
+def draw_polygon(p_list, algorithm, fmt='points'):
+    """绘制多边形（所有边一次批量绘制）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
+    :return: (numpy.ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标，与cg_algorithms.draw_polygon一致
+    """
+    points = np.asarray(p_list, np.int64).reshape(-1, 2)
+    if len(points) == 0:
+        return format_pixels(_empty(), fmt)
+    edges = np.empty((len(points), 4), np.int64)  # 第i条边为points[i - 1]到points[i]
+    edges[0, :2] = points[-1]
+    edges[1:, :2] = points[:-1]
+    edges[:, 2:] = points
+    return format_pixels(draw_lines(edges, algorithm)[0], fmt)
+
+
+@functools.lru_cache(maxsize=64)
+def bezier_basis(n, samples=CURVE_SAMPLES):
+    """n次Bernstein基函数在samples个均匀参数点上的取值，按(次数, 采样数)缓存，同次数的曲线共用
+
+    用递推 B[k][i] = (1 - u) * B[k-1][i] + u * B[k-1][i-1] 计算，次数很高时也不会溢出。
+    :return: (numpy.ndarray of float64, shape (samples, n + 1)) 只读矩阵，第v行为u = v / (samples - 1)处的基函数值
+    """
+    u = (np.arange(samples) / (samples - 1))[:, None]
+    basis = np.ones((samples, 1))
+    for _ in range(n):
+        basis = np.hstack((basis * (1 - u), np.zeros((samples, 1)))) + np.hstack((np.zeros((samples, 1)), basis * u))
+    basis.flags.writeable = False
+    return basis
+
+
+def _de_casteljau(points, u):
+    """de Casteljau算法，对多个参数值同时计算，运算顺序与cg_algorithms.draw_curve完全相同
+
+    :param points: (numpy.ndarray, shape (n + 1, 2)) 控制点
+    :param u: (numpy.ndarray, shape (m,)) 参数值
+    :return: (numpy.ndarray of float64, shape (m, 2)) 曲线上的点
+    """
+    u = u[:, None, None]
+    loc = np.broadcast_to(points, (len(u),) + points.shape)
+    while loc.shape[1] > 1:
+        loc = (1 - u) * loc[:, :-1] + u * loc[:, 1:]
+    return loc[:, 0]
+
+
+@functools.lru_cache(maxsize=8)
+def b_spline_basis(samples=CURVE_SAMPLES):
+    """三次均匀B样条4个基函数（未除以6）在samples个均匀参数点上的取值，所有曲线段、所有曲线共用
+
+    :return: (numpy.ndarray of float64, shape (samples, 4)) 只读矩阵
+    """
+    u = np.arange(samples) / (samples - 1)
+    basis = np.column_stack((-u ** 3 + 3 * u ** 2 - 3 * u + 1, 3 * u ** 3 - 6 * u ** 2 + 4,
+                             -3 * u ** 3 + 3 * u ** 2 + 3 * u + 1, u ** 3))
+    basis.flags.writeable = False
+    return basis
+
+
+def _b_spline_point(window, u):
+    """按cg_algorithms.draw_curve的运算顺序计算一段B样条曲线上参数为u的点"""
+    t = [-u ** 3 + 3 * u ** 2 - 3 * u + 1, 3 * u ** 3 - 6 * u ** 2 + 4,
+         -3 * u ** 3 + 3 * u ** 2 + 3 * u + 1, u ** 3]
+    point = [0, 0]
+    for j in range(4):
+        point[0] += t[j] * window[j][0]
+        point[1] += t[j] * window[j][1]
+    return [point[0] / 6, point[1] / 6]
+
+
+def _unique_adjacent(pixels):
+    """去掉与前一个像素相同的像素"""
+    if len(pixels) == 0:
+        return pixels
+    keep = np.ones(len(pixels), bool)
+    keep[1:] = (pixels[1:] != pixels[:-1]).any(axis=1)
+    return pixels[keep]
+
+
+def draw_curve(p_list, algorithm, fmt='points'):
+    """绘制曲线（向量化版本）
+
+    'Bezier'曲线的所有采样点由Bernstein基矩阵与控制点坐标一次矩阵乘法得到；
+    'B-spline'曲线的所有曲线段由同一张基函数表一次批量矩阵乘法得到，并去掉相邻的重复像素。
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
+    :return: (numpy.ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标，'Bezier'与cg_algorithms.draw_curve一致，
+             'B-spline'为cg_algorithms.draw_curve的结果去掉相邻重复像素
+    """
+    return format_pixels(_draw_curve(p_list, algorithm), fmt)
+
+
+def _draw_curve(p_list, algorithm):
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return _empty()
+    if algorithm == 'Bezier':
+        samples = bezier_basis(len(points) - 1) @ points
+        # 离x.5很近的采样点舍入方向取决于计算顺序，对这些点按de Casteljau算法重新计算，保证与cg_algorithms一致
+        ties = np.flatnonzero((np.abs(samples - np.floor(samples) - 0.5) < 1e-6).any(axis=1))
+        if len(ties):
+            samples[ties] = _de_casteljau(points, ties / (CURVE_SAMPLES - 1))
+        return np.rint(samples).astype(np.int32)
+    if algorithm == 'B-spline':
+        if len(points) < 4:
+            return _empty()
+        windows = points[np.arange(len(points) - 3)[:, None] + np.arange(4)]  # (段数, 4, 2)
+        samples = (b_spline_basis() @ windows / 6).reshape(-1, 2)
+        ties = np.flatnonzero((np.abs(samples - np.floor(samples) - 0.5) < 1e-6).any(axis=1))
+        for k in ties:
+            segment, v = divmod(int(k), CURVE_SAMPLES)
+            samples[k] = _b_spline_point(p_list[segment:segment + 4], v / (CURVE_SAMPLES - 1))
+        return _unique_adjacent(np.rint(samples).astype(np.int32))
+    return _empty()
+
+
+def draw_curve_coarse(p_list, algorithm, samples=COARSE_SAMPLES, fmt='points'):
+    """用少量采样点近似绘制曲线，相邻采样点之间用DDA直线连接，用于交互过程中的预览
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'
+    :param samples: (int) Bezier曲线或每段B样条曲线的采样点数
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
+    :return: (numpy.ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    if algorithm == 'Bezier' and len(points) > 0:
+        curve = bezier_basis(len(points) - 1, samples) @ points
+    elif algorithm == 'B-spline' and len(points) >= 4:
+        windows = points[np.arange(len(points) - 3)[:, None] + np.arange(4)]
+        curve = (b_spline_basis(samples) @ windows / 6).reshape(-1, 2)
+    else:
+        return format_pixels(_empty(), fmt)
+    curve = np.rint(curve).astype(np.int64)
+    return format_pixels(draw_lines(np.hstack((curve[:-1], curve[1:])), 'DDA')[0], fmt)
+
+
+def _per_vertex(value, offsets):
+    """把每个图元一个的参数展开到该图元的每个顶点上，标量原样返回"""
+    value = np.asarray(value)
+    if value.ndim == 0:
+        return value
+    return np.repeat(value, np.diff(offsets))
+
+
+def item_centers(coords, offsets):
+    """各图元包围盒的中心，用于绕各自中心旋转、缩放
+
+    :param coords: (numpy.ndarray of int, shape (N, 2)) 所有图元的顶点坐标首尾相接
+    :param offsets: (numpy.ndarray of int, shape (M + 1,)) 第i个图元的顶点为coords[offsets[i]:offsets[i + 1]]
+    :return: (tuple: (x, y)) 两个长度为M的int64数组，没有顶点的图元中心为(0, 0)
+    """
+    offsets = np.asarray(offsets, np.int64)
+    nonempty = np.flatnonzero(np.diff(offsets) > 0)
+    x, y = np.zeros(len(offsets) - 1, np.int64), np.zeros(len(offsets) - 1, np.int64)
+    if len(nonempty):
+        starts = offsets[nonempty]
+        lo, hi = np.minimum.reduceat(coords, starts), np.maximum.reduceat(coords, starts)
+        x[nonempty], y[nonempty] = (lo[:, 0] + hi[:, 0]) // 2, (lo[:, 1] + hi[:, 1]) // 2
+    return x, y
+
+
+def translate_items(coords, offsets, dx, dy):
+    """批量平移，结果与对每个图元调用cg_algorithms.translate相同
+
+    :param coords: (numpy.ndarray of int, shape (N, 2)) 所有图元的顶点坐标首尾相接
+    :param offsets: (numpy.ndarray of int, shape (M + 1,)) 第i个图元的顶点为coords[offsets[i]:offsets[i + 1]]
+    :param dx: (int or array-like of int, shape (M,)) 水平方向平移量，所有图元共用或每个图元一个
+    :param dy: (int or array-like of int, shape (M,)) 垂直方向平移量
+    :return: (numpy.ndarray of int64, shape (N, 2)) 变换后的顶点坐标
+    """
+    coords = np.asarray(coords, np.int64)
+    return np.column_stack((coords[:, 0] + _per_vertex(dx, offsets), coords[:, 1] + _per_vertex(dy, offsets)))
+
+
+def rotate_items(coords, offsets, x, y, r):
+    """批量旋转，运算顺序与cg_algorithms.rotate相同，结果与逐个图元旋转一致
+
+    :param x: (int or array-like of int, shape (M,)) 旋转中心x坐标，所有图元共用或每个图元一个，见item_centers
+    :param y: (int or array-like of int, shape (M,)) 旋转中心y坐标
+    :param r: (float or array-like of float, shape (M,)) 顺时针旋转角度（°）
+    :return: (numpy.ndarray of int64, shape (N, 2)) 变换后的顶点坐标，其余参数见translate_items
+    """
+    coords = np.asarray(coords, np.int64)
+    x, y = _per_vertex(x, offsets), _per_vertex(y, offsets)
+    # 三角函数用math按不同的角度各算一次，np.cos与math.cos在最后一位上可能不同
+    angles, index = np.unique(np.asarray(r, np.float64), return_inverse=True)
+    cos = np.array([math.cos(math.radians(angle)) for angle in angles.tolist()])[index.reshape(np.shape(r))]
+    sin = np.array([math.sin(math.radians(angle)) for angle in angles.tolist()])[index.reshape(np.shape(r))]
+    cos, sin = _per_vertex(cos, offsets), _per_vertex(sin, offsets)
+    dx, dy = coords[:, 0] - x, coords[:, 1] - y
+    return np.column_stack((np.rint(x + dx * cos - dy * sin), np.rint(y + dx * sin + dy * cos))).astype(np.int64)
+
+
+def scale_items(coords, offsets, x, y, s):
+    """批量缩放，运算顺序与cg_algorithms.scale相同，结果与逐个图元缩放一致
+
+    :param x: (int or array-like of int, shape (M,)) 缩放中心x坐标，所有图元共用或每个图元一个，见item_centers
+    :param y: (int or array-like of int, shape (M,)) 缩放中心y坐标
+    :param s: (float or array-like of float, shape (M,)) 缩放倍数
+    :return: (numpy.ndarray of int64, shape (N, 2)) 变换后的顶点坐标，其余参数见translate_items
+    """
+    coords = np.asarray(coords, np.int64)
+    x, y, s = _per_vertex(x, offsets), _per_vertex(y, offsets), _per_vertex(s, offsets)
+    return np.column_stack((np.rint(x + (coords[:, 0] - x) * s), np.rint(y + (coords[:, 1] - y) * s))).astype(np.int64)
+
+
+def _ellipse_pixels(a, b):
+    """估计半轴长为a、b的椭圆的像素点数（四个象限各约a + b个），用于判断结果是否放进缓存"""
+    return 4 * (math.ceil(a) + math.ceil(b) + 1)
+
+
+@functools.lru_cache(maxsize=ELLIPSE_CACHE_SIZE)
+def _ellipse(a, b, fmt):
+    """以原点为中心、半轴长为a、b的椭圆，结果只读，由draw_ellipse平移后使用"""
+    result = np.array(alg.draw_ellipse([[-a, -b], [a, b]], fmt=fmt), np.int32).reshape(-1, 3 if fmt == 'spans' else 2)
+    result.flags.writeable = False
+    return result
+
+
+def draw_ellipse(p_list, fmt='points'):
+    """绘制椭圆，结果与cg_algorithms.draw_ellipse完全相同
+
+    以原点为中心的结果按半轴长(a, b)缓存在LRU缓存里，平移到椭圆中心后返回，重复出现的同样大小的椭圆只计算一次。
+    像素数超过ELLIPSE_CACHE_PIXELS的大椭圆每次重新计算，不占用缓存。
+    缓存的命中、未命中次数见ellipse_cache_info()
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框左上角和右下角顶点坐标
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels
+    :return: (numpy.ndarray of int32) 'points'和'unique'为 (N, 2) 的像素数组，'spans'为 (K, 3) 的区间数组
+    """
+    (x0, y0), (x1, y1) = p_list
+    a, b = int(abs(x1 - x0) / 2), int(abs(y0 - y1) / 2)
+    xc, yc = int((x0 + x1) / 2), int((y0 + y1) / 2)
+    ellipse = _ellipse.__wrapped__ if _ellipse_pixels(a, b) > ELLIPSE_CACHE_PIXELS else _ellipse
+    return ellipse(a, b, fmt) + ([yc, xc, xc] if fmt == 'spans' else [xc, yc])
+
+
+ellipse_cache_info = _ellipse.cache_info  # 返回(hits, misses, maxsize, currsize)
+
+
+@functools.lru_cache(maxsize=ELLIPSE_CACHE_SIZE)
+def _rotated_ellipse(a, b, angle, fmt):
+    """以原点为中心的旋转椭圆，结果只读，由draw_rotated_ellipse平移后使用"""
+    theta = math.radians(angle)
+    cos, sin = math.cos(theta), math.sin(theta)
+    # 椭圆方程 A x^2 + B xy + C y^2 = 1
+    A = cos * cos / (a * a) + sin * sin / (b * b)
+    B = 2 * cos * sin * (1 / (a * a) - 1 / (b * b))
+    C = sin * sin / (a * a) + cos * cos / (b * b)
+    half_w = math.sqrt(a * a * cos * cos + b * b * sin * sin)
+    half_h = math.sqrt(a * a * sin * sin + b * b * cos * cos)
+    # 陡峭的部分逐行取点（每行解出两个x），平缓的部分逐列取点，类似中点算法按斜率分区域逐步前进
+    ys = np.arange(-math.floor(half_h), math.floor(half_h) + 1, dtype=np.float64)
+    root = np.sqrt(np.maximum(B * B * ys * ys - 4 * A * (C * ys * ys - 1), 0))
+    row_x = np.concatenate(((-B * ys - root) / (2 * A), (-B * ys + root) / (2 * A)))
+    row_y = np.concatenate((ys, ys))
+    xs = np.arange(-math.floor(half_w), math.floor(half_w) + 1, dtype=np.float64)
+    root = np.sqrt(np.maximum(B * B * xs * xs - 4 * C * (A * xs * xs - 1), 0))
+    col_y = np.concatenate(((-B * xs - root) / (2 * C), (-B * xs + root) / (2 * C)))
+    col_x = np.concatenate((xs, xs))
+    # 按该点处的法向量（方程的梯度）判断斜率。行、列取点的位置略有不同，斜率接近1处两种取点各放宽一些，
+    # 互相重叠，否则可能两边都不取而断开；代价是重叠处偶尔多出个别像素，与中点算法的结果不完全相同
+    steep = 1.25 * np.abs(2 * A * row_x + B * row_y) >= np.abs(B * row_x + 2 * C * row_y)
+    flat = 1.25 * np.abs(B * col_x + 2 * C * col_y) >= np.abs(2 * A * col_x + B * col_y)
+    pixels = np.rint(np.column_stack((np.concatenate((row_x[steep], col_x[flat])),
+                                      np.concatenate((row_y[steep], col_y[flat]))))).astype(np.int32)
+    result = format_pixels(format_pixels(pixels, 'unique'), fmt)
+    result.flags.writeable = False
+    return result
+
+
+def draw_rotated_ellipse(center, a, b, angle, fmt='points'):
+    """绘制旋转后的椭圆：中心为center，长度为a、b的两条半轴分别沿x、y轴方向放置后再顺时针旋转angle度
+
+    以原点为中心的结果按(a, b, angle)缓存，中心取整后平移得到，大小、方向相同的椭圆只计算一次；
+    与draw_ellipse相同，像素数超过ELLIPSE_CACHE_PIXELS的大椭圆不进缓存
+    :param center: (tuple of float: (x, y)) 椭圆中心，舍入到整数
+    :param a: (float) x方向的半轴长
+    :param b: (float) y方向的半轴长
+    :param angle: (float) 顺时针旋转角度（°），与cg_algorithms.rotate相同
+    :param fmt: (string) 输出格式，'points'、'unique'或'spans'，见format_pixels；'points'同样不含重复的像素点
+    :return: (numpy.ndarray of int32) 'points'和'unique'为 (N, 2) 的像素数组，'spans'为 (K, 3) 的区间数组
+    """
+    a, b = round(abs(a), 9), round(abs(b), 9)  # 去掉变换矩阵带来的浮点误差，提高缓存命中率
+    angle = round(angle % 180, 9)  # 椭圆旋转180度后与原来重合
+    if fmt == 'points':
+        fmt = 'unique'
+    x, y = round(center[0]), round(center[1])
+    if a == 0 or b == 0:  # 退化为线段
+        theta = math.radians(angle)
+        dx, dy = a * math.cos(theta) - b * math.sin(theta), a * math.sin(theta) + b * math.cos(theta)
+        pixels = draw_line([[round(x - dx), round(y - dy)], [round(x + dx), round(y + dy)]], 'DDA')
+        return format_pixels(pixels, fmt)
+    ellipse = _rotated_ellipse.__wrapped__ if _ellipse_pixels(a, b) > ELLIPSE_CACHE_PIXELS else _rotated_ellipse
+    result = ellipse(a, b, angle, fmt)
+    return result + ([y, x, x] if fmt == 'spans' else [x, y])
+
+
+def clip_polygon(p_list, clip_list):
+    """Sutherland-Hodgman多边形裁剪，每条裁剪边对所有顶点一次完成内外判断和求交，结果与cg_algorithms.clip_polygon相同
+
+    :param p_list: (array-like of int, shape (N, 2)) 被裁剪多边形的顶点坐标
+    :param clip_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 凸的裁剪窗口的顶点坐标，顺时针、逆时针均可
+    :return: (numpy.ndarray of int64, shape (K, 2)) 裁剪后多边形的顶点坐标
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    xs, ys = points[:, 0].copy(), points[:, 1].copy()
+    clip_list = alg.orient_window(clip_list)
+    for i in range(len(clip_list)):
+        (x3, y3), (x4, y4) = clip_list[i - 1], clip_list[i]
+        ex, ey = x4 - x3, y4 - y3
+        # 各顶点到裁剪边的有向距离，与cg_algorithms.is_inside中的R相同；水平、竖直的边只需一次乘法
+        if ex == 0:
+            d = -(ey * (xs - x3))
+        elif ey == 0:
+            d = ex * (ys - y3)
+        else:
+            d = ex * (ys - y3) - ey * (xs - x3)
+        inside = d <= 0
+        crossing = np.flatnonzero(inside != np.roll(inside, 1))  # 起点、终点一内一外的边，边j从顶点j - 1到顶点j
+        if len(crossing) == 0:  # 全部在这条边内侧时不变，全部在外侧时裁剪结果为空
+            if not inside.all():
+                xs, ys = xs[:0], ys[:0]
+            continue
+        x1, y1, x2, y2 = xs[crossing - 1], ys[crossing - 1], xs[crossing], ys[crossing]
+        # 与cg_algorithms.compute_intersection相同的求交方法
+        if ex == 0 and ey != 0:
+            y = y1 + (x3 - x1) / (x2 - x1) * (y2 - y1)
+            x = np.full(len(crossing), float(x3))
+        elif ey == 0 and ex != 0:
+            x = x1 + (y3 - y1) / (y2 - y1) * (x2 - x1)
+            y = np.full(len(crossing), float(y3))
+        else:
+            d1, d2 = d[crossing - 1], d[crossing]
+            t = d1 / (d1 - d2)
+            x, y = x1 + t * (x2 - x1), y1 + t * (y2 - y1)
+        # 每个顶点依次输出：进入窗口的边的交点或离开窗口的边的交点、在窗口内的顶点本身，end为各顶点输出的结束位置
+        count = inside.astype(np.int64)
+        count[crossing] += 1
+        end = np.cumsum(count)
+        order = np.empty(end[-1], np.int64)  # 结果中各点在原顶点与交点拼接而成的数组中的下标
+        kept = np.flatnonzero(inside)
+        order[end[kept] - 1] = kept
+        order[end[crossing] - count[crossing]] = np.arange(len(xs), len(xs) + len(crossing))
+        xs, ys = np.concatenate((xs, x)).take(order), np.concatenate((ys, y)).take(order)
+    return np.rint(np.column_stack((xs, ys))).astype(np.int64)